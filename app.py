@@ -3,7 +3,7 @@ Zomato Reconciliation Tool - Flask Web Application
 Fixed template version - users only upload invoices
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import os
 import shutil
 import tempfile
@@ -13,6 +13,7 @@ import uuid
 import time
 import threading
 import gc
+import json
 
 # Import backend processing
 from process_invoices import process_zomato_recon
@@ -21,6 +22,10 @@ import swiggy_dineout_process
 import zomato_pay_process
 from zomato_consolidated_process import process_zomato_consolidated
 import paytm_process
+from job_queue import JobQueue, QueueFullError, UploadedFile
+from upload_buffer import SPOOL_MAX_MEMORY
+from progress_store import ProgressStore
+from bank_cache import BankStatementCache
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
@@ -31,17 +36,31 @@ app.config['SWIGGY_TEMPLATE_FILE'] = 'template_files/recon_template.xlsx' # Swig
 app.config['SWIGGY_DINEOUT_TEMPLATE'] = 'template_files/dineout_template.xlsx' # New Template
 app.config['ZOMATO_PAY_TEMPLATE'] = 'template_files/zpay_template.xlsx' # Zomato Pay Template
 app.config['PAYTM_TEMPLATE'] = 'template_files/paytm_template.xlsx' # Paytm Template
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 2))  # Engines running at once
+app.config['JOB_EXECUTOR'] = os.environ.get('JOB_EXECUTOR', 'process')  # 'process' (one core per engine) or 'thread'
+app.config['JOB_QUEUE_LIMIT'] = int(os.environ.get('JOB_QUEUE_LIMIT', 20))  # Jobs allowed to wait for a worker
+# Processes one engine job may start to read its invoices; unset = the job's share of the cores (see nested_workers)
+app.config['NESTED_WORKERS'] = int(os.environ['NESTED_WORKERS']) if os.environ.get('NESTED_WORKERS') else None
+app.config['PROGRESS_STREAM_KEEPALIVE'] = 15  # Seconds between SSE keep-alive comments
+app.config['PROGRESS_STREAM_TIMEOUT'] = 3600  # Longest a progress stream stays open
+app.config['BANK_CACHE_TTL'] = int(os.environ.get('BANK_CACHE_TTL', 6 * 3600))  # Idle seconds a parsed statement is kept
+app.config['FULL_DATA_DUMP'] = os.environ.get('FULL_DATA_DUMP', '1') != '0'  # '0': D1W/calculation sheets keep only the columns the recon reads
+app.config['READER_BACKENDS'] = {  # Invoice reader per engine: 'openpyxl' or 'xml' (direct XML streaming)
+    engine: os.environ.get(f'{engine.upper()}_READER', 'openpyxl') for engine in ('zomato', 'zpay')
+}
 
 # Create folders if they don't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+BANK_EXTENSIONS = ALLOWED_EXTENSIONS | {'csv'}
+PAYTM_EXTENSIONS = ALLOWED_EXTENSIONS | {'csv'}
 
 
-def allowed_file(filename):
+def allowed_file(filename, extensions=ALLOWED_EXTENSIONS):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
 
 
 def get_formatted_filename(client_name, recon_type, month_name):
@@ -69,13 +88,6 @@ def cleanup_folder_delayed(folder_path, delay=3):
             if os.path.exists(folder_path):
                 shutil.rmtree(folder_path)
                 print(f"✅ Cleaned up session folder: {folder_path}")
-            
-            # Also clean up the progress file if possible
-            # Get session_id from folder name
-            session_id = os.path.basename(folder_path)
-            # We don't necessarily know the task_id here, but we can search for it
-            # if we standardized task_id to follow session_id or just clean up old ones.
-            # For now, rely on cleanup_old_files for the .progress files if we can't link them easily.
         except Exception as e:
             print(f"⚠️  Could not cleanup {folder_path}: {e}")
 
@@ -83,31 +95,210 @@ def cleanup_folder_delayed(folder_path, delay=3):
     thread.start()
 
 
-# Task Progress Tracking
+def release_session_folder(session_folder):
+    """Release file handles and schedule removal of a finished upload session"""
+    # ✅ Force garbage collection to release file handles
+    gc.collect()
+    # ✅ Cleanup session folder in BACKGROUND (delayed)
+    if session_folder and os.path.exists(session_folder):
+        cleanup_folder_delayed(session_folder, delay=2)
+
+
+# Task Progress Tracking (in memory, see progress_store.py)
+progress_store = ProgressStore(ttl=3600)
+
+
 def update_progress(task_id, progress):
-    """Update progress for a specific task using a temporary file"""
-    if task_id:
-        try:
-            progress_file = os.path.join(app.config['UPLOAD_FOLDER'], f"{task_id}.progress")
-            with open(progress_file, 'w') as f:
-                f.write(str(progress))
-            print(f"Task {task_id} progress: {progress}%")
-        except Exception as e:
-            print(f"⚠️ Error updating progress file: {e}")
+    """Update progress for a specific task"""
+    if progress_store.update(task_id, progress):
+        print(f"Task {task_id} progress: {progress}%")
 
 @app.route('/progress/<task_id>')
 def get_progress(task_id):
-    """Get current progress for a task from its progress file"""
+    """Get current progress for a task"""
+    entry = progress_store.get(task_id)
+    return jsonify({'progress': entry['progress'] if entry else 0})
+
+
+def progress_event(entry):
+    """Format a progress snapshot as one Server-Sent Event"""
+    data = {'progress': entry['progress'], 'stage': entry['stage']}
+    if entry['result']:
+        data.update(entry['result'])
+    return f"data: {json.dumps(data)}\n\n"
+
+
+@app.route('/progress/<task_id>/stream')
+def stream_progress(task_id):
+    """Push progress, stage and the final download link of a task as Server-Sent Events"""
+    keepalive = app.config['PROGRESS_STREAM_KEEPALIVE']
+    deadline = time.time() + app.config['PROGRESS_STREAM_TIMEOUT']
+
+    def events():
+        yield "retry: 3000\n\n"
+        version = 0  # Waits for the task to appear if the upload has not registered it yet
+        while time.time() < deadline:
+            entry = progress_store.wait_for_change(task_id, version, timeout=keepalive)
+            if not entry or entry['version'] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = entry['version']
+            yield progress_event(entry)
+            if entry['stage'] in ('done', 'failed'):
+                return
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# Background Jobs
+def publish_job_status(job):
+    """Mirror job stage (and the final payload) into the task's progress stream"""
+    if job.task_id:
+        progress_store.update(
+            job.task_id, job.progress, stage=job.status,
+            result=job.to_dict() if job.finished else None
+        )
+
+
+job_queue = JobQueue(
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_QUEUE_LIMIT'],
+    executor=app.config['JOB_EXECUTOR'],
+    progress_listener=update_progress,
+    status_listener=publish_job_status
+)
+
+
+def nested_workers():
+    """
+    Processes a job submitted now may use to read its invoices in parallel.
+    The cores are split between it and the jobs already queued or running: a job
+    alone on an idle server fans out over every core, one joining a busy pool
+    reads serially. NESTED_WORKERS, when set, is used as a fixed value instead.
+    """
+    if app.config['NESTED_WORKERS'] is not None:
+        return app.config['NESTED_WORKERS']
+    return max(1, (os.cpu_count() or 1) // (job_queue.unfinished_count() + 1))
+
+
+def enqueue_job(kind, target, args=(), kwargs=None, **options):
+    """Submit an engine run and build the immediate HTTP response"""
+    try:
+        job = job_queue.submit(kind, target, args, kwargs, **options)
+    except QueueFullError as e:
+        if options.get('cleanup'):
+            options['cleanup']()
+        return jsonify({'success': False, 'message': str(e)}), 503
+
+    response = {
+        'success': True,
+        'message': f'{kind} reconciliation queued',
+        'job_id': job.job_id,
+        'status_url': f"/jobs/{job.job_id}",
+        'result_url': f"/jobs/{job.job_id}/result"
+    }
+    if job.task_id:
+        response['stream_url'] = f"/progress/{job.task_id}/stream"
+    return jsonify(response), 202
+
+
+def buffer_uploads(files):
+    """
+    Keep uploaded files past the request (and able to reach an engine process).
+    The first SPOOL_MAX_MEMORY bytes of a request are held in memory; later files
+    are saved to a private temp folder instead. Returns (uploads, spill folder or
+    None); release the folder once the job has finished.
+    """
+    uploads, spill_folder, in_memory = [], None, 0
+    for f in files:
+        if not f or not f.filename:
+            continue
+        size = f.stream.seek(0, os.SEEK_END)
+        f.stream.seek(0)
+        if in_memory + size <= SPOOL_MAX_MEMORY:
+            in_memory += size
+            uploads.append(UploadedFile(f.filename, f.read(), content_type=f.content_type))
+            continue
+        if spill_folder is None:
+            spill_folder = tempfile.mkdtemp(prefix='recon_upload_')  # 0700, outside the download folder
+        path = os.path.join(spill_folder, f"{len(uploads)}_{secure_filename(f.filename)}")
+        f.save(path)
+        uploads.append(UploadedFile(f.filename, content_type=f.content_type, path=path))
+    return uploads, spill_folder
+
+
+# Bank Statements parsed once through POST /bank and referenced by later recon requests
+# as bankRef (API only: the upload form sends its bank file with the job). See bank_cache.py.
+bank_cache = BankStatementCache(ttl=app.config['BANK_CACHE_TTL'])
+
+
+def referenced_bank_statement():
+    """
+    Cached statement named by the request's 'bankRef' form field ('/bank/<hash>'
+    or the bare hash). Returns (hash, statement), or (None, None) when the request
+    has no reference; raises ValueError if it has expired or is unknown.
+    """
+    bank_ref = request.form.get('bankRef', '').strip()
+    if not bank_ref:
+        return None, None
+    bank_hash = bank_ref.rstrip('/').rsplit('/', 1)[-1]
+    statement = bank_cache.get(bank_hash)
+    if statement is None:
+        raise ValueError('Bank statement reference expired or unknown. Please upload the bank file again.')
+    return bank_hash, statement
+
+
+@app.route('/bank', methods=['POST'])
+def upload_bank_statement():
+    """Parse a bank statement once and return the /bank/<hash> reference other uploads can use"""
+    bank_file = request.files.get('bankFile')
+    if not bank_file or bank_file.filename == '':
+        return jsonify({'success': False, 'message': 'No bank file uploaded'}), 400
+    if not allowed_file(bank_file.filename, BANK_EXTENSIONS):
+        return jsonify({'success': False, 'message': 'Invalid bank file format'}), 400
     try:
-        progress_file = os.path.join(app.config['UPLOAD_FOLDER'], f"{task_id}.progress")
-        if os.path.exists(progress_file):
-            with open(progress_file, 'r') as f:
-                progress = f.read().strip()
-                return jsonify({'progress': int(progress)})
+        bank_hash, _ = bank_cache.load(bank_file.read(), secure_filename(bank_file.filename))
     except Exception as e:
-        print(f"⚠️ Error reading progress file: {e}")
-    
-    return jsonify({'progress': 0})
+        return jsonify({'success': False, 'message': f'Could not read bank statement: {e}'}), 400
+    return jsonify({'success': True, 'bank_url': f"/bank/{bank_hash}", **bank_cache.info(bank_hash)})
+
+
+@app.route('/bank/<bank_hash>')
+def get_bank_statement(bank_hash):
+    """Details of a cached bank statement (404 once it has expired)"""
+    info = bank_cache.info(bank_hash)
+    if not info:
+        return jsonify({'success': False, 'message': 'Bank statement not found'}), 404
+    return jsonify({'success': True, 'bank_url': f"/bank/{bank_hash}", **info})
+
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Get status, progress and (once finished) the download link of a job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result')
+def get_job_result(job_id):
+    """Download the output of a finished job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job.status == 'failed':
+        return jsonify(job.to_dict()), 500
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 202
+    if not job.output_path or not os.path.exists(job.output_path):
+        return jsonify({'success': False, 'message': 'Output file no longer available'}), 410
+    return send_file(job.output_path, as_attachment=True)
+
 
 @app.route('/')
 def index():
@@ -135,30 +326,35 @@ def upload_swiggy_dineout():
         # Optional: Save template if user provided one? 
         # For now assume static template path key
         
-        # Define progress callback
-        p_func = lambda p: update_progress(task_id, p)
-        
         output_filename = get_formatted_filename(client_name, "Swiggy Dineout", month)
-        
-        output_file, error = swiggy_dineout_process.process_swiggy_dineout(
-            invoice_files,
-            app.config['SWIGGY_DINEOUT_TEMPLATE'],
-            app.config['OUTPUT_FOLDER'],
-            p_func,
-            client_name=client_name,
-            month=month,
-            forced_filename=output_filename # Pass filename
+
+        def finalize(result):
+            output_file, error = result
+            if error:
+                return {'success': False, 'message': f"Error: {error}"}
+            return {
+                'success': True,
+                'message': 'Swiggy Dineout Reconciliation Completed!',
+                'download_url': f"/download/{output_file}"
+            }
+
+        uploads, spill_folder = buffer_uploads(invoice_files)
+        return enqueue_job(
+            'Swiggy Dineout',
+            swiggy_dineout_process.process_swiggy_dineout,
+            (uploads, app.config['SWIGGY_DINEOUT_TEMPLATE'], app.config['OUTPUT_FOLDER']),
+            dict(
+                client_name=client_name,
+                month=month,
+                forced_filename=output_filename, # Pass filename
+                read_workers=nested_workers()
+            ),
+            finalize=finalize,
+            cleanup=lambda: release_session_folder(spill_folder),
+            task_id=task_id,
+            output_path=os.path.join(app.config['OUTPUT_FOLDER'], output_filename),
+            progress_arg='update_progress'
         )
-        
-        if error:
-            return jsonify({'success': False, 'message': f"Error: {error}"})
-            
-        download_url = f"/download/{output_file}"
-        return jsonify({
-            'success': True, 
-            'message': 'Swiggy Dineout Reconciliation Completed!',
-            'download_url': download_url
-        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -185,34 +381,41 @@ def upload_zomato_pay():
         if not invoice_files or invoice_files[0].filename == '':
             return jsonify({'success': False, 'message': 'No invoice files selected'})
             
-        # Define progress callback
-        p_func = lambda p: update_progress(task_id, p)
-        
         output_filename = get_formatted_filename(client_name, "Zomato Pay", month)
 
-        output_file, error = zomato_pay_process.process_zomato_pay(
-            invoice_files,
-            app.config['ZOMATO_PAY_TEMPLATE'],
-            app.config['OUTPUT_FOLDER'],
-            p_func,
-            client_name=client_name,
-            month=month,
-            first_start=f_start,
-            first_end=f_end,
-            last_start=l_start,
-            last_end=l_end,
-            forced_filename=output_filename # Pass filename
+        def finalize(result):
+            output_file, error = result
+            if error:
+                return {'success': False, 'message': f"Error: {error}"}
+            return {
+                'success': True,
+                'message': 'Zomato Pay Reconciliation Completed!',
+                'download_url': f"/download/{output_file}"
+            }
+
+        uploads, spill_folder = buffer_uploads(invoice_files)
+        return enqueue_job(
+            'Zomato Pay',
+            zomato_pay_process.process_zomato_pay,
+            (uploads, app.config['ZOMATO_PAY_TEMPLATE'], app.config['OUTPUT_FOLDER']),
+            dict(
+                client_name=client_name,
+                month=month,
+                first_start=f_start,
+                first_end=f_end,
+                last_start=l_start,
+                last_end=l_end,
+                forced_filename=output_filename, # Pass filename
+                read_workers=nested_workers(),
+                full_dump=app.config['FULL_DATA_DUMP'],
+                reader_backend=app.config['READER_BACKENDS']['zpay']
+            ),
+            finalize=finalize,
+            cleanup=lambda: release_session_folder(spill_folder),
+            task_id=task_id,
+            output_path=os.path.join(app.config['OUTPUT_FOLDER'], output_filename),
+            progress_arg='update_progress'
         )
-        
-        if error:
-            return jsonify({'success': False, 'message': f"Error: {error}"})
-            
-        download_url = f"/download/{output_file}"
-        return jsonify({
-            'success': True, 
-            'message': 'Zomato Pay Reconciliation Completed!',
-            'download_url': download_url
-        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -290,67 +493,47 @@ def upload_files():
         task_id = request.form.get('task_id')
         if task_id:
             update_progress(task_id, 5) # Initial progress
-          # Run processing in background if many files, or synchronous if simple
-        try:
-            p_func = lambda p: update_progress(task_id, p)
-            
-            if recon_mode == 'consolidated':
-                result = process_zomato_consolidated(
-                    invoice_folder,
-                    app.config['TEMPLATE_FILE'],
-                    output_path,
-                    client_name=client_name,
-                    month=month,
-                    first_week_start=first_week_start,
-                    first_week_end=first_week_end,
-                    last_week_start=last_week_start,
-                    last_week_end=last_week_end,
-                    progress_callback=p_func
-                )
-            else: # Default to weekly or other modes handled by process_zomato_recon
-                result = process_zomato_recon(
-                    invoice_folder,
-                    app.config['TEMPLATE_FILE'],
-                    output_path,
-                    client_name=client_name,
-                    month=month,
-                    first_week_start=first_week_start,
-                    first_week_end=first_week_end,
-                    last_week_start=last_week_start,
-                    last_week_end=last_week_end,
-                    progress_callback=p_func
-                )
-        except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"❌ Processing Error:\n{error_details}")
-            return jsonify({
-                'success': False,
-                'message': f"Processing Error: {str(e)}",
-                'traceback': error_details
-            }), 500
-
-
-        # ✅ Force garbage collection to release file handles
-        gc.collect()
-        time.sleep(0.5)  # Small delay to ensure handles are released
 
-        # ✅ Cleanup session folder in BACKGROUND (delayed)
-        if session_folder and os.path.exists(session_folder):
-            cleanup_folder_delayed(session_folder, delay=2)
-
-        if result.get('success'):
-            return jsonify({
-                'success': True,
-                'message': f"Successfully processed {result['weeks_processed']} weeks",
-                'download_url': f"/download/{output_filename}",
-                'weeks_processed': result['weeks_processed']
-            })
+        engine_kwargs = dict(
+            client_name=client_name,
+            month=month,
+            first_week_start=first_week_start,
+            first_week_end=first_week_end,
+            last_week_start=last_week_start,
+            last_week_end=last_week_end,
+            full_dump=app.config['FULL_DATA_DUMP'],
+            reader_backend=app.config['READER_BACKENDS']['zomato']
+        )
+        # Default to weekly or other modes handled by process_zomato_recon
+        if recon_mode == 'consolidated':
+            engine = process_zomato_consolidated
         else:
-            return jsonify({
+            engine = process_zomato_recon
+            engine_kwargs['parse_workers'] = nested_workers()
+
+        def finalize(result):
+            if result.get('success'):
+                return {
+                    'success': True,
+                    'message': f"Successfully processed {result['weeks_processed']} weeks",
+                    'download_url': f"/download/{output_filename}",
+                    'weeks_processed': result['weeks_processed']
+                }
+            return {
                 'success': False,
                 'message': result.get('message', 'Processing failed')
-            })
+            }
+
+        return enqueue_job(
+            'Zomato',
+            engine,
+            (invoice_folder, app.config['TEMPLATE_FILE'], output_path),
+            engine_kwargs,
+            finalize=finalize,
+            cleanup=lambda: release_session_folder(session_folder),
+            task_id=task_id,
+            output_path=output_path
+        )
 
     except Exception as e:
         import traceback
@@ -397,7 +580,8 @@ def upload_swiggy_files():
         if not invoice_files or invoice_files[0].filename == '':
             return jsonify({'success': False, 'message': 'No invoice files selected'})
 
-        bank_file = request.files.get('bankFile')
+        # Write only the matched deposit rows to the BANK sheet instead of the whole statement
+        bank_matched_only = request.form.get('bankMatchedOnly', '').lower() in ('1', 'true', 'on', 'yes')
 
         client_name = request.form.get('clientName', '').strip()
         month = request.form.get('month', '').strip()
@@ -427,16 +611,18 @@ def upload_swiggy_files():
             shutil.rmtree(session_folder)
             return jsonify({'success': False, 'message': 'No valid invoice files uploaded'})
 
-        # Save optional bank file
+        # Optional bank statement: a bankRef from POST /bank, or a file the job reads itself
+        try:
+            bank_hash, bank_statement = referenced_bank_statement()
+        except ValueError as e:
+            shutil.rmtree(session_folder)
+            return jsonify({'success': False, 'message': str(e)})
+
+        bank_file = request.files.get('bankFile')
         bank_file_path = None
-        if bank_file and bank_file.filename != '':
-            if allowed_file(bank_file.filename):
-                bank_filename = secure_filename(bank_file.filename)
-                # Save just outside session folder or inside? Inside is cleaner for cleanup.
-                # But process_invoices_web might expect it elsewhere? 
-                # The original code saved it in UPLOAD_FOLDER with a unique name.
-                # Let's save it in session_folder for easier cleanup.
-                bank_file_path = os.path.join(session_folder, f"bank_{bank_filename}")
+        if bank_statement is None and bank_file and bank_file.filename != '':
+            if allowed_file(bank_file.filename, BANK_EXTENSIONS):
+                bank_file_path = os.path.join(session_folder, f"bank_{secure_filename(bank_file.filename)}")
                 bank_file.save(bank_file_path)
             else:
                 shutil.rmtree(session_folder)
@@ -450,36 +636,44 @@ def upload_swiggy_files():
         if task_id:
             update_progress(task_id, 5) # Initial progress
 
-        result = process_invoices_web(
-            invoice_folder_path=session_folder,
-            template_recon_path=app.config['SWIGGY_TEMPLATE_FILE'],
-            output_path=output_path,
-            client_name=client_name,
-            month=month,
-            first_week_start=first_week_start,
-            first_week_end=first_week_end,
-            last_week_start=last_week_start,
-            last_week_end=last_week_end,
-            bank_file_path=bank_file_path,
-            progress_callback=lambda p: update_progress(task_id, p)
-        )
-
-        # Cleanup
-        gc.collect()
-        if session_folder and os.path.exists(session_folder):
-            cleanup_folder_delayed(session_folder, delay=2)
-
-        if result['success']:
-            return jsonify({
-                'success': True,
-                'message': result.get('message', 'Processed successfully'),
-                'download_url': f"/download/{output_filename}"
-            })
-        else:
-             return jsonify({
+        def finalize(result):
+            if result['success']:
+                payload = {
+                    'success': True,
+                    'message': result.get('message', 'Processed successfully'),
+                    'download_url': f"/download/{output_filename}"
+                }
+                if bank_hash:
+                    payload['bank_url'] = f"/bank/{bank_hash}"  # Still cached for the next recon of this client
+                return payload
+            return {
                 'success': False,
                 'message': result.get('message', 'Processing failed')
-            })
+            }
+
+        return enqueue_job(
+            'Swiggy',
+            process_invoices_web,
+            kwargs=dict(
+                invoice_folder_path=session_folder,
+                template_recon_path=app.config['SWIGGY_TEMPLATE_FILE'],
+                output_path=output_path,
+                client_name=client_name,
+                month=month,
+                first_week_start=first_week_start,
+                first_week_end=first_week_end,
+                last_week_start=last_week_start,
+                last_week_end=last_week_end,
+                bank_file_path=bank_file_path,
+                bank_matched_only=bank_matched_only,
+                bank_statement=bank_statement,
+                full_dump=app.config['FULL_DATA_DUMP']
+            ),
+            finalize=finalize,
+            cleanup=lambda: release_session_folder(session_folder),
+            task_id=task_id,
+            output_path=output_path
+        )
 
     except Exception as e:
         import traceback
@@ -521,44 +715,51 @@ def upload_paytm():
         session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
         os.makedirs(session_folder, exist_ok=True)
 
-        # Save the first file (Paytm is expected as single file)
-        file = invoice_files[0]
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        # Save every export for the month (xlsx or csv), in upload order
+        saved_invoices = []
+        for idx, file in enumerate(invoice_files, 1):
+            if file and allowed_file(file.filename, PAYTM_EXTENSIONS):
+                filepath = os.path.join(session_folder, f"{idx}_{secure_filename(file.filename)}")
+                file.save(filepath)
+                saved_invoices.append(filepath)
+
+        if not saved_invoices:
+            shutil.rmtree(session_folder)
+            return jsonify({'success': False, 'message': 'No valid Paytm files uploaded (.xlsx, .xls or .csv)'})
 
         output_filename = get_formatted_filename(client_name, "Paytm", month)
         output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
 
         task_id = request.form.get('task_id')
-        p_func = lambda p: update_progress(task_id, p)
         if task_id: update_progress(task_id, 10)
 
-        result = paytm_process.process_paytm(
-            filepath,
-            app.config['PAYTM_TEMPLATE'],
-            output_path,
-            client_name=client_name,
-            month=month,
-            first_week_start=first_week_start,
-            first_week_end=first_week_end,
-            last_week_start=last_week_start,
-            last_week_end=last_week_end,
-            progress_callback=p_func
+        def finalize(result):
+            if result['success']:
+                return {
+                    'success': True,
+                    'message': 'Paytm Reconciliation Complete',
+                    'download_url': f"/download/{output_filename}"
+                }
+            return {'success': False, 'message': result.get('message', 'Processing failed')}
+
+        return enqueue_job(
+            'Paytm',
+            paytm_process.process_paytm,
+            (saved_invoices, app.config['PAYTM_TEMPLATE'], output_path),
+            dict(
+                client_name=client_name,
+                month=month,
+                first_week_start=first_week_start,
+                first_week_end=first_week_end,
+                last_week_start=last_week_start,
+                last_week_end=last_week_end
+            ),
+            finalize=finalize,
+            cleanup=lambda: release_session_folder(session_folder),
+            task_id=task_id,
+            output_path=output_path
         )
 
-        if session_folder and os.path.exists(session_folder):
-            cleanup_folder_delayed(session_folder, delay=2)
-
-        if result['success']:
-            return jsonify({
-                'success': True,
-                'message': 'Paytm Reconciliation Complete',
-                'download_url': f"/download/{output_filename}"
-            })
-        else:
-            return jsonify({'success': False, 'message': result.get('message', 'Processing failed')})
-
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -601,7 +802,7 @@ def cleanup_old_files():
                         cleaned += 1
                     except:
                         pass
-            elif item.endswith('.progress'):
+            elif item.endswith('.progress'):  # Left over from file based progress tracking
                 age = now - os.path.getmtime(item_path)
                 if age > 3600: # 1 hour
                     try:
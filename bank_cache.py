@@ -0,0 +1,108 @@
+"""
+In-memory cache of parsed bank statements for the web app.
+A client's month-end runs several recons against the same statement: POST
+/bank parses and indexes it once, keyed by the SHA-256 of the file contents,
+and later requests pass the /bank/<hash> reference as bankRef to reuse it.
+Entries hold the typed columns plus the uploaded file's bytes (which the BANK
+sheet is streamed from again), never the raw rows.
+"""
+
+import hashlib
+import threading
+import time
+
+from bank_statement import load_bank_statement_bytes
+
+
+class BankStatementCache:
+    """
+    Thread-safe content hash -> BankStatement map.
+
+    - Content keyed: the same file uploaded twice (under any name) is parsed once,
+      and concurrent uploads of it wait for the first parse instead of repeating it.
+    - TTL: statements not used for `ttl` seconds are evicted lazily.
+    - Bounded: beyond `max_entries` the least recently used statement goes first.
+    """
+
+    def __init__(self, ttl=6 * 3600, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # hash -> {'statement', 'filename', 'created_at', 'used_at'}
+        self._loading = {}  # hash -> Event set once the first parse finishes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def load(self, data, filename):
+        """Return (hash, statement) for an uploaded file, parsing it only if it is not cached"""
+        key = self.key_for(data)
+        while True:
+            with self._lock:
+                self._evict_expired(time.time())
+                entry = self._touch(key)
+                if entry:
+                    print(f"🏦 Bank statement {key[:12]} reused from cache ({filename})")
+                    return key, entry['statement']
+                loading = self._loading.get(key)
+                if loading is None:
+                    self._loading[key] = threading.Event()
+                    break
+            loading.wait()  # Another request is parsing this file; use its result
+
+        try:
+            statement = load_bank_statement_bytes(data, filename)
+            with self._lock:
+                now = time.time()
+                self._entries[key] = {'statement': statement, 'filename': filename,
+                                      'created_at': now, 'used_at': now}
+                self._evict_overflow()
+            print(f"🏦 Bank statement {key[:12]} parsed: {len(statement)} rows ({filename})")
+            return key, statement
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def get(self, key):
+        """Cached statement for a hash (refreshing its TTL), or None if unknown/expired"""
+        with self._lock:
+            entry = self._touch(key)
+            return entry['statement'] if entry else None
+
+    def info(self, key):
+        """Summary of a cached statement for the /bank/<hash> route, or None"""
+        with self._lock:
+            entry = self._touch(key)
+            if not entry:
+                return None
+            statement = entry['statement']
+            return {
+                'bank_hash': key,
+                'filename': entry['filename'],
+                'rows': len(statement),
+                'deposits': len(statement.deposit_index()),
+                'header_row': statement.header_row,
+                'expires_in': int(self.ttl - (time.time() - entry['used_at'])),
+            }
+
+    def _touch(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if now - entry['used_at'] > self.ttl:
+            del self._entries[key]
+            return None
+        entry['used_at'] = now
+        return entry
+
+    def _evict_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry['used_at'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def _evict_overflow(self):
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda key: self._entries[key]['used_at'])
+            del self._entries[oldest]
@@ -0,0 +1,135 @@
+"""
+Bank deposit matching for the recon engines.
+Deposits are parsed once into a sorted index, each expected receipt finds
+its ±tolerance window with bisect, and expected receipts are paired with
+deposits one-to-one by a minimum-cost assignment over those windows.
+"""
+
+import bisect
+
+AMOUNT_UNITS = 10 ** 6  # Diffs are compared as integer micro-units, so ties are exact
+
+
+def parse_amount(val):
+    """Bank cell -> number (strings lose commas, ₹, spaces and stray characters); None if not a number"""
+    if isinstance(val, str):
+        cleaned = val.replace(",", "").replace("\u200c", "").replace("₹", "").replace(" ", "")
+        cleaned = ''.join(c for c in cleaned if c.isdigit() or c == '.' or c == '-')
+        try:
+            val = float(cleaned)
+        except Exception:
+            return None
+    if isinstance(val, (int, float)):
+        return val
+    return None
+
+
+class DepositIndex:
+    """Non-zero deposits sorted by amount, with the bank row each came from"""
+
+    def __init__(self, deposits):
+        entries = sorted((amount, row) for amount, row in deposits)
+        self.amounts = [amount for amount, _ in entries]
+        self.rows = [row for _, row in entries]
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def window(self, expected, tolerance):
+        """Indexes of deposits within ±tolerance of expected, nearest first (earlier row wins a tie)"""
+        # Bisect a slightly wider range, then apply the exact |deposit - expected| <= tolerance test
+        slack = 1e-9 * max(1.0, abs(expected), tolerance)
+        lo = bisect.bisect_left(self.amounts, expected - tolerance - slack)
+        hi = bisect.bisect_right(self.amounts, expected + tolerance + slack)
+        hits = [i for i in range(lo, hi) if abs(self.amounts[i] - expected) <= tolerance]
+        return sorted(hits, key=lambda i: (abs(self.amounts[i] - expected), self.rows[i]))
+
+
+def _min_cost_assignment(cost, n_cols):
+    """
+    Hungarian algorithm: cost is a list of n rows of n_cols integers (n <= n_cols).
+    Returns the column assigned to each row, minimising the total cost.
+    """
+    n = len(cost)
+    u, v = [0] * (n + 1), [0] * (n_cols + 1)
+    owner, way = [0] * (n_cols + 1), [0] * (n_cols + 1)
+    for i in range(1, n + 1):
+        owner[0], j0 = i, 0
+        min_v, used = [float('inf')] * (n_cols + 1), [False] * (n_cols + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = owner[j0], float('inf'), 0
+            for j in range(1, n_cols + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < min_v[j]:
+                        min_v[j], way[j] = cur, j0
+                    if min_v[j] < delta:
+                        delta, j1 = min_v[j], j
+            for j in range(n_cols + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    assigned = [None] * n
+    for j in range(1, n_cols + 1):
+        if owner[j]:
+            assigned[owner[j] - 1] = j - 1
+    return assigned
+
+
+def match_deposits(expected_by_key, index, tolerance):
+    """
+    Pair each expected receipt with at most one deposit and each deposit with at most one receipt.
+
+    The assignment is globally optimal: as many receipts as possible are matched,
+    then the total |deposit - expected| is as small as possible, then earlier bank
+    rows are preferred. Returns (matches, unmatched) where matches maps
+    key -> (amount, bank_row, diff) and unmatched lists the (amount, bank_row)
+    deposits left over, in bank row order.
+    """
+    keys = list(expected_by_key)
+    if not keys or not len(index):
+        leftovers = sorted(zip(index.rows, index.amounts))
+        return {}, [(amount, row) for row, amount in leftovers]
+
+    # A receipt never needs more than len(keys) candidates: the others can take at most
+    # len(keys) - 1 of them, and any nearer free one beats a deposit further out.
+    windows = {key: index.window(expected_by_key[key], tolerance)[:len(keys)] for key in keys}
+    candidates = sorted({i for hits in windows.values() for i in hits})
+    column_of = {i: col for col, i in enumerate(candidates)}
+
+    tolerance_units = int(round(tolerance * AMOUNT_UNITS))
+    row_weight = (max(index.rows) + 1) * len(keys) + 1   # Any diff step outweighs every row tie-break
+    unmatched_cost = len(keys) * (tolerance_units + 1) * row_weight + 1
+    forbidden = unmatched_cost * (len(keys) + 1)
+
+    # Columns: candidate deposits, then one "no deposit" column per receipt
+    n_cols = len(candidates) + len(keys)
+    cost = []
+    for k, key in enumerate(keys):
+        row_cost = [forbidden] * n_cols
+        for i in windows[key]:
+            diff_units = int(round(abs(index.amounts[i] - expected_by_key[key]) * AMOUNT_UNITS))
+            row_cost[column_of[i]] = diff_units * row_weight + index.rows[i]
+        row_cost[len(candidates) + k] = unmatched_cost
+        cost.append(row_cost)
+
+    matches, used = {}, set()
+    for key, col in zip(keys, _min_cost_assignment(cost, n_cols)):
+        if col < len(candidates):
+            i = candidates[col]
+            used.add(i)
+            matches[key] = (index.amounts[i], index.rows[i], abs(index.amounts[i] - expected_by_key[key]))
+
+    unmatched = sorted((index.rows[i], index.amounts[i]) for i in range(len(index)) if i not in used)
+    return matches, [(amount, row) for row, amount in unmatched]
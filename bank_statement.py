@@ -0,0 +1,201 @@
+"""
+Bank statement ingestion for the recon engines.
+Reads xlsx or CSV exports row by row, finds the header (which may sit under
+a preamble) within the first rows, and folds the rows below it into a typed
+columnar table of deposits, dates and narrations for matching. The raw rows
+are not kept: the BANK sheet streams the file again, with bulk appends,
+either in full or just the rows that were matched.
+"""
+
+import csv
+import io
+import os
+from contextlib import closing
+from itertools import chain, islice
+
+import openpyxl
+
+from bank_matching import DepositIndex, parse_amount
+from process_invoices import DateColumnParser
+
+BANK_HEADER_SCAN_ROWS = 25  # Rows searched for the header line
+DEPOSIT_LABELS = ["deposit amt.", "credit amount(inr)", "credit", "deposit", "amount"]
+DATE_LABELS = ["txn date", "transaction date", "value date", "tran date", "date"]
+NARRATION_LABELS = ["narration", "description", "particulars", "remarks", "details"]
+
+
+def iter_bank_rows(path, sheet_name=None, filename=None):
+    """
+    Yield every row of a bank export as a tuple of cell values (first sheet for xlsx).
+    path may also be a binary file object, with filename telling CSV from xlsx.
+    """
+    if str(filename or path).lower().endswith(".csv"):
+        yield from _iter_csv_rows(path)
+        return
+
+    wb = openpyxl.load_workbook(path, data_only=False, read_only=True)
+    try:
+        sheet = wb[sheet_name or wb.sheetnames[0]]
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_csv_rows(path):
+    # Amounts are plain ASCII; a stray non-UTF-8 byte in a narration must not sink the import
+    if hasattr(path, "read"):
+        f = io.TextIOWrapper(path, newline="", encoding="utf-8-sig", errors="replace")
+    else:
+        f = open(path, newline="", encoding="utf-8-sig", errors="replace")
+    with f:
+        try:
+            dialect = csv.Sniffer().sniff(f.read(64 * 1024), delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        for row in csv.reader(f, dialect):
+            yield tuple(value if value.strip() else None for value in row)
+
+
+def _header_text(value):
+    return str(value).lower().strip() if value else ""
+
+
+def find_deposit_column(header):
+    """Index of the first column whose header contains a deposit label, or None"""
+    for idx, value in enumerate(header):
+        text = _header_text(value)
+        if any(label in text for label in DEPOSIT_LABELS):
+            return idx
+    return None
+
+
+def _find_labelled_column(header, labels, exclude=None):
+    texts = [_header_text(value) for value in header]
+    for label in labels:
+        for idx, text in enumerate(texts):
+            if idx != exclude and label in text:
+                return idx
+    return None
+
+
+def find_header_row(rows):
+    """
+    Index (0-based) of the header among rows: the first with a deposit column and
+    a date or narration column, else the first with just a deposit column.
+    """
+    fallback = None
+    for idx, row in enumerate(rows):
+        deposit_col = find_deposit_column(row)
+        if deposit_col is None:
+            continue
+        if (_find_labelled_column(row, DATE_LABELS, exclude=deposit_col) is not None
+                or _find_labelled_column(row, NARRATION_LABELS, exclude=deposit_col) is not None):
+            return idx
+        if fallback is None:
+            fallback = idx
+    return fallback
+
+
+class BankStatement:
+    """
+    One bank statement: typed columns for the rows under the header, each
+    tagged with its statement row number. rows may be any iterable; they are
+    folded into the columns as they stream in and only the header scan window
+    is held at once. source (path or bytes, sheet name, filename) lets
+    iter_rows() read the raw rows again for the BANK sheet.
+    """
+
+    def __init__(self, name, rows, header_scan_rows=BANK_HEADER_SCAN_ROWS, source=None):
+        self.name = name
+        self.source = source
+        rows = iter(rows)
+        head = list(islice(rows, header_scan_rows))
+        header_idx = find_header_row(head)
+        self.header_row = header_idx + 1 if header_idx is not None else None
+        self.header = list(head[header_idx]) if header_idx is not None else []
+
+        self.deposit_col = find_deposit_column(self.header)
+        self.date_col = _find_labelled_column(self.header, DATE_LABELS, exclude=self.deposit_col)
+        self.narration_col = _find_labelled_column(self.header, NARRATION_LABELS, exclude=self.deposit_col)
+
+        self.row_numbers, self.deposits, self.dates, self.narrations = [], [], [], []
+        self._deposit_index = None
+        if self.header_row is None:
+            return
+        date_parser = DateColumnParser()
+        for row_num, row in enumerate(chain(head[self.header_row:], rows), self.header_row + 1):
+            self.row_numbers.append(row_num)
+            self.deposits.append(parse_amount(self._value(row, self.deposit_col)))
+            self.dates.append(date_parser.get(self._value(row, self.date_col)))
+            narration = self._value(row, self.narration_col)
+            self.narrations.append(str(narration).strip() if narration is not None else None)
+
+    @staticmethod
+    def _value(row, col):
+        return row[col] if col is not None and col < len(row) else None
+
+    def __len__(self):
+        return len(self.row_numbers)
+
+    def iter_rows(self):
+        """Stream the statement's raw rows again from its source"""
+        if self.source is None:
+            raise ValueError(f"Bank statement {self.name} has no source to read its rows from")
+        path, sheet_name, filename = self.source
+        if isinstance(path, (bytes, bytearray)):
+            path = io.BytesIO(path)
+        return iter_bank_rows(path, sheet_name, filename=filename)
+
+    def deposit_index(self):
+        """Non-zero deposits, sorted for matching, keyed by statement row number (built once)"""
+        if self._deposit_index is None:
+            self._deposit_index = DepositIndex(
+                (amount, row_num) for amount, row_num in zip(self.deposits, self.row_numbers)
+                if amount is not None and amount != 0)
+        return self._deposit_index
+
+
+def load_bank_statement(path, sheet_name=None, header_scan_rows=BANK_HEADER_SCAN_ROWS):
+    """Stream an xlsx/CSV bank export into a BankStatement"""
+    return BankStatement(os.path.basename(str(path)), iter_bank_rows(path, sheet_name),
+                         header_scan_rows=header_scan_rows, source=(path, sheet_name, None))
+
+
+def load_bank_statement_bytes(data, filename, sheet_name=None, header_scan_rows=BANK_HEADER_SCAN_ROWS):
+    """Stream an uploaded xlsx/CSV bank export (raw bytes) into a BankStatement"""
+    rows = iter_bank_rows(io.BytesIO(data), sheet_name, filename=filename)
+    return BankStatement(os.path.basename(filename), rows, header_scan_rows=header_scan_rows,
+                         source=(data, sheet_name, filename))
+
+
+def write_bank_sheet(recon_wb, statement, only_rows=None, recon_bank_name='BANK'):
+    """
+    (Re)create the BANK sheet from a statement with bulk appends, streaming
+    its rows from the source file. By default every statement row is copied
+    as-is; with only_rows (statement row numbers) just the header and those
+    rows are written.
+    """
+    if recon_bank_name in recon_wb.sheetnames:
+        recon_wb.remove(recon_wb[recon_bank_name])
+    recon_bank = recon_wb.create_sheet(recon_bank_name)
+
+    if only_rows is None:
+        with closing(statement.iter_rows()) as rows:
+            for row in rows:
+                recon_bank.append(row)
+        return recon_bank
+
+    if statement.header_row is not None:
+        recon_bank.append(statement.header)
+    wanted = set(only_rows)
+    if not wanted:
+        return recon_bank
+    last_wanted = max(wanted)
+    with closing(statement.iter_rows()) as rows:
+        for row_num, row in enumerate(rows, 1):
+            if row_num in wanted:
+                recon_bank.append(row)
+            if row_num >= last_wanted:
+                break
+    return recon_bank
@@ -0,0 +1,75 @@
+"""
+Benchmark: building a D1W sheet with insert_rows(1, 4) vs. reserving rows 1-4 up front.
+
+    python benchmarks/d1w_layout_bench.py [rows] [cols]
+
+Defaults to a 50,000 row x 30 column Order Level sheet. Both layouts are
+checked cell-for-cell before the timings are printed.
+"""
+
+import random
+import sys
+import time
+
+import openpyxl
+
+D1W_HEADER_ROW = 5
+
+
+def make_rows(n_rows, n_cols):
+    random.seed(1)
+    header = [f"Column {c}" for c in range(1, n_cols + 1)]
+    rows = [
+        tuple(round(random.uniform(0, 1000), 2) if c % 3 else f"R{r}C{c}" for c in range(n_cols))
+        for r in range(n_rows)
+    ]
+    return header, rows
+
+
+def build_with_insert(header, rows):
+    """Old layout: header on row 1, data below, then shift everything down 4 rows"""
+    ws = openpyxl.Workbook().active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    start = time.perf_counter()
+    ws.insert_rows(1, 4)
+    return ws, time.perf_counter() - start
+
+
+def build_reserved(header, rows):
+    """New layout: header written straight to row 5, data appended from row 6"""
+    ws = openpyxl.Workbook().active
+    for col_num, value in enumerate(header, 1):
+        ws.cell(row=D1W_HEADER_ROW, column=col_num).value = value
+    for row in rows:
+        ws.append(row)
+    return ws, 0.0
+
+
+def timed(build, header, rows):
+    start = time.perf_counter()
+    ws, shift_time = build(header, rows)
+    return ws, time.perf_counter() - start, shift_time
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_cols = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    header, rows = make_rows(n_rows, n_cols)
+
+    old_ws, old_total, old_shift = timed(build_with_insert, header, rows)
+    new_ws, new_total, _ = timed(build_reserved, header, rows)
+
+    old_cells = {(c.row, c.column): c.value for r in old_ws.iter_rows() for c in r if c.value is not None}
+    new_cells = {(c.row, c.column): c.value for r in new_ws.iter_rows() for c in r if c.value is not None}
+    assert old_cells == new_cells, "Layouts differ"
+
+    print(f"D1W layout, {n_rows:,} rows x {n_cols} cols (outputs identical)")
+    print(f"  insert_rows(1, 4): {old_total:6.2f}s total, {old_shift:6.2f}s of it shifting cells")
+    print(f"  reserved rows 1-4: {new_total:6.2f}s total")
+    print(f"  saved:             {old_total - new_total:6.2f}s ({(1 - new_total / old_total) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
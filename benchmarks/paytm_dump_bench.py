@@ -0,0 +1,87 @@
+"""
+Benchmark: pasting a Paytm export into "Paytm Calculations", cell by cell (old) vs. write_frame (new).
+
+    python benchmarks/paytm_dump_bench.py [rows ...] [--cols N]
+
+Defaults to exports of 10,000, 50,000 and 100,000 rows x 16 columns with the
+dtype mix pandas gives a real Paytm CSV (text ids and statuses, float amounts,
+int counts, text dates), pasted into a fresh sheet from row 10 down.
+Both sheets are checked cell-for-cell before rows/sec are printed.
+"""
+
+import os
+import random
+import sys
+import time
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from paytm_process import write_frame
+
+HEADER_ROW = 10  # Paytm Calculations: rows 1-9 hold the weekly totals
+
+
+def make_export(n_rows, n_cols):
+    random.seed(1)
+    data = {
+        "transaction_id": [f"T{r:09d}" for r in range(n_rows)],
+        "status": [random.choice(["SUCCESS", "SUCCESS", "SUCCESS", "FAILED"]) for _ in range(n_rows)],
+        "amount": [round(random.uniform(10, 5000), 2) for _ in range(n_rows)],
+        "commission": [round(random.uniform(0, 50), 2) for _ in range(n_rows)],
+        "transaction_date": [f"'2026-09-{random.randint(1, 30):02d} 12:{random.randint(0, 59):02d}:00" for _ in range(n_rows)],
+    }
+    for c in range(len(data), n_cols):
+        if c % 3 == 0:
+            data[f"extra_{c}"] = [random.randint(0, 10 ** 6) for _ in range(n_rows)]
+        elif c % 3 == 1:
+            data[f"extra_{c}"] = [round(random.uniform(0, 1000), 2) for _ in range(n_rows)]
+        else:
+            data[f"extra_{c}"] = [f"R{r}C{c}" for r in range(n_rows)]
+    return pd.DataFrame(data)
+
+
+def write_cellwise(ws, df):
+    """The previous paste loop"""
+    for idx, h in enumerate(df.columns.tolist(), 1):
+        ws.cell(row=HEADER_ROW, column=idx).value = h
+    for r_idx, row in enumerate(df.values, HEADER_ROW + 1):
+        for c_idx, val in enumerate(row, 1):
+            ws.cell(row=r_idx, column=c_idx).value = val
+
+
+def timed(write, df):
+    ws = openpyxl.Workbook().active
+    start = time.perf_counter()
+    write(ws, df)
+    return ws, time.perf_counter() - start
+
+
+def main():
+    args = sys.argv[1:]
+    n_cols, sizes = 16, []
+    while args:
+        arg = args.pop(0)
+        if arg == "--cols":
+            n_cols = int(args.pop(0))
+        else:
+            sizes.append(int(arg))
+    sizes = sizes or [10000, 50000, 100000]
+
+    print(f"Paytm raw data paste, {n_cols} cols")
+    print(f"  {'rows':>8}  {'old rows/s':>11}  {'new rows/s':>11}  {'speed-up':>9}")
+    for n_rows in sizes:
+        df = make_export(n_rows, n_cols)
+        old_ws, old_time = timed(write_cellwise, df)
+        new_ws, new_time = timed(lambda ws, frame: write_frame(ws, frame, header_row=HEADER_ROW), df)
+        old_rows = list(old_ws.iter_rows(values_only=True))
+        new_rows = list(new_ws.iter_rows(values_only=True))
+        assert old_rows == new_rows, f"Sheets differ at {n_rows} rows"
+        assert all(type(a) is type(b) for ra, rb in zip(old_rows, new_rows) for a, b in zip(ra, rb) if a is not None)
+        print(f"  {n_rows:>8,}  {n_rows / old_time:>11,.0f}  {n_rows / new_time:>11,.0f}  {old_time / new_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
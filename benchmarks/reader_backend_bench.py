@@ -0,0 +1,172 @@
+"""
+Benchmark: reading an Order Level sheet with the openpyxl backend vs. the xml (xlsx_stream) backend.
+
+    python benchmarks/reader_backend_bench.py [rows ...] [--cols N]
+
+Defaults to monthly Order Level sheets of 10,000 and 50,000 orders x 80
+columns: a 6 row preamble, the header on row 7 and the invoice's mix of text
+ids, text dates, statuses and amounts. Each backend reads the sheet through
+SheetReader twice, keeping every column (full dump) and keeping only
+ZOMATO_D1W_COLUMNS (projected). Both backends are checked row-for-row before
+rows/sec are printed.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from invoice_reader import SheetReader, open_invoice_workbook
+from process_invoices import ORDER_COUNT_COLUMNS, ORDER_FILTER_COLUMNS, ZOMATO_D1W_COLUMNS
+
+HEADER_ROW = 7
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+PACKAGE_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+DOC_RELS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+ORDER_LEVEL_HEADER = [
+    "S.No.", "Order ID", "Order Date", "Week No.", "Res. name",
+    "Order status (Delivered/ Cancelled/ Rejected)", "Customer ID", "Subtotal (items total)",
+    "Packaging Charge", "Delivery charge for restaurants on self logistics",
+    "Restaurant discount (Promo)", "Restaurant discount (BOGO, Freebies, Gold, Brand pack & others)",
+    "Delivery charge discount/ Relisting discount", "Total GST collected from customers",
+    "Net order value", "Commissionable value (excludes customer gst)", "Base service fee",
+    "Payment mechanism fee", "Long distance enablement fee", "Discount on long distance enablement fee",
+    "Discount on service fee due to 30% capping", "Net Additions \n(cancellation refund for cancelled orders)",
+    "Customer Compensation/Recoupment", "TDS 194O amount", "TCS IGST amount",
+    "GST paid by Zomato on behalf of restaurant - under section 9(5)",
+    "Extra inventory ads (order level deduction)", "Order level Payout", "Remarks",
+]
+
+
+def make_rows(n_rows, n_cols):
+    random.seed(1)
+    for r in range(1, HEADER_ROW):
+        yield [f"preamble {r}"]
+    yield ORDER_LEVEL_HEADER + [f"Additional field {c}" for c in range(len(ORDER_LEVEL_HEADER), n_cols)]
+    for r in range(n_rows):
+        row = [
+            r + 1, f"Z{100000 + r}", f"{random.randint(1, 30):02d}/09/2026", "W", "Resto",
+            random.choice(["Delivered", "Delivered", "Delivered", "Cancelled", "Rejected"]), f"C{r % 5000}",
+        ]
+        row += [round(random.uniform(-50, 1500), 2) for _ in range(len(row), len(ORDER_LEVEL_HEADER) - 1)]
+        row.append(random.choice([None, "note", "late delivery"]))
+        for c in range(len(ORDER_LEVEL_HEADER), n_cols):
+            row.append(f"R{r}F{c}" if c % 4 == 0 else round(random.uniform(0, 1000), 2))
+        yield row
+
+
+def make_invoice(path, n_rows, n_cols):
+    """
+    Write the package XML directly, laid out the way Excel saves invoices: a
+    <dimension>, text in the shared string table, cell references on every cell.
+    (openpyxl writes text as inline strings, and no dimension in write-only mode.)
+    """
+    strings, string_ids = [], {}
+    sheet_rows = []
+    for r, row in enumerate(make_rows(n_rows, n_cols), 1):
+        cells = []
+        for c, value in enumerate(row, 1):
+            ref = f"{get_column_letter(c)}{r}"
+            if value is None:
+                continue
+            if isinstance(value, str):
+                if value not in string_ids:
+                    string_ids[value] = len(strings)
+                    strings.append(value)
+                cells.append(f'<c r="{ref}" t="s"><v>{string_ids[value]}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        sheet_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+
+    dimension = f"A1:{get_column_letter(n_cols)}{n_rows + HEADER_ROW}"
+    parts = {
+        "[Content_Types].xml": (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{CONTENT_TYPE}.sheet.main+xml"/>'
+            f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{CONTENT_TYPE}.worksheet+xml"/>'
+            f'<Override PartName="/xl/sharedStrings.xml" ContentType="{CONTENT_TYPE}.sharedStrings+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{CONTENT_TYPE}.styles+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            f'<Relationships xmlns="{PACKAGE_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{DOC_RELS_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        "xl/workbook.xml": (
+            f'<workbook xmlns="{MAIN_NS}" xmlns:r="{DOC_RELS_NS}">'
+            '<sheets><sheet name="Order Level" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships xmlns="{PACKAGE_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{DOC_RELS_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{DOC_RELS_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+            f'<Relationship Id="rId3" Type="{DOC_RELS_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ),
+        "xl/styles.xml": (
+            f'<styleSheet xmlns="{MAIN_NS}"><fonts count="1"><font/></fonts>'
+            '<fills count="1"><fill><patternFill patternType="none"/></fill></fills><borders count="1"><border/></borders>'
+            '<cellStyleXfs count="1"><xf/></cellStyleXfs><cellXfs count="1"><xf xfId="0"/></cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+        ),
+        "xl/worksheets/sheet1.xml": (
+            f'<worksheet xmlns="{MAIN_NS}"><dimension ref="{dimension}"/>'
+            f'<sheetData>{"".join(sheet_rows)}</sheetData></worksheet>'
+        ),
+        "xl/sharedStrings.xml": (
+            f'<sst xmlns="{MAIN_NS}" count="{len(strings)}" uniqueCount="{len(strings)}">'
+            + "".join(f"<si><t>{escape(text)}</t></si>" for text in strings) + "</sst>"
+        ),
+    }
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        for name, xml in parts.items():
+            package.writestr(name, xml)
+
+
+def read_sheet(path, backend, columns):
+    start = time.perf_counter()
+    wb = open_invoice_workbook(path, backend)
+    reader = SheetReader(wb["Order Level"], HEADER_ROW, columns, leading=ORDER_COUNT_COLUMNS, reads=ORDER_FILTER_COLUMNS)
+    rows = [reader.header] + list(reader.rows())
+    wb.close()
+    return rows, time.perf_counter() - start
+
+
+def main():
+    args = sys.argv[1:]
+    n_cols, sizes = 80, []
+    while args:
+        arg = args.pop(0)
+        if arg == "--cols":
+            n_cols = int(args.pop(0))
+        else:
+            sizes.append(int(arg))
+    sizes = sizes or [10000, 50000]
+
+    print(f"Order Level read, {n_cols} cols")
+    print(f"  {'rows':>8}  {'mode':<9}  {'openpyxl rows/s':>15}  {'xml rows/s':>11}  {'speed-up':>9}")
+    with tempfile.TemporaryDirectory() as folder:
+        for n_rows in sizes:
+            path = os.path.join(folder, f"order_level_{n_rows}.xlsx")
+            make_invoice(path, n_rows, n_cols)
+            for mode, columns in [("full", None), ("projected", ZOMATO_D1W_COLUMNS)]:
+                old_rows, old_time = read_sheet(path, "openpyxl", columns)
+                new_rows, new_time = read_sheet(path, "xml", columns)
+                assert old_rows == new_rows, f"Backends differ at {n_rows} rows ({mode})"
+                print(f"  {n_rows:>8,}  {mode:<9}  {n_rows / old_time:>15,.0f}  {n_rows / new_time:>11,.0f}  {old_time / new_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
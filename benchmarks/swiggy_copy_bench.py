@@ -0,0 +1,148 @@
+"""
+Benchmark: Swiggy copy_data, cell-by-cell (old) vs. streaming iter_rows + append (new).
+
+    python benchmarks/swiggy_copy_bench.py [rows ...] [--cols N] [--budget SECONDS]
+
+Defaults to Order Level sheets of 1,000, 10,000 and 50,000 rows x 30 columns,
+saved to a temp dir and reopened read-only exactly like a real invoice.
+The old copy re-parses the sheet XML up to row r on every .cell() call, so it
+is quadratic; it gets --budget seconds per size (default 60) and, if it runs
+out, the full time is estimated (marked "est.") by timing single .cell() reads
+at five rows spread over the sheet and summing the interpolated per-cell cost
+over every cell. Every row the old copy produced is checked against the new
+copy before timings are printed.
+
+The new copy is also run into a reused target: a D1W sheet still holding a
+longer week's rows (as when a week is processed twice). It must come out
+identical to the copy into a fresh sheet, with no old rows left and no gap.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from swiggy_process import copy_data, get_safe_dimensions
+
+SRC_START_ROW = 3  # Order Level header row in a Swiggy invoice
+TGT_START_ROW = 5  # D1W rows 1-4 are reserved for totals
+
+
+def make_invoice(path, n_rows, n_cols):
+    random.seed(1)
+    wb = openpyxl.Workbook()  # Not write_only: keep the <dimension> tag Excel writes
+    ws = wb.active
+    ws.title = "Order Level"
+    ws.append(["Order Level"])
+    ws.append([])
+    ws.append([f"Column {c}" for c in range(1, n_cols + 1)])
+    for r in range(n_rows):
+        ws.append([round(random.uniform(0, 1000), 2) if c % 3 else f"R{r}C{c}" for c in range(n_cols)])
+    wb.save(path)
+
+
+def make_reused_target(n_rows, n_cols):
+    """A sheet already filled with more rows than the copy brings"""
+    ws = openpyxl.Workbook().active
+    for r in range(n_rows + TGT_START_ROW + 100):
+        ws.append([f"old {r}"] * n_cols)
+    return ws
+
+
+def copy_data_cellwise(src, tgt, start_row, tgt_start_row, budget):
+    """The previous copy_data loop; stops after `budget` seconds, returns rows copied"""
+    max_row, max_col = get_safe_dimensions(src)
+    deadline = time.perf_counter() + budget
+    for r in range(start_row, max_row + 1):
+        for c in range(1, max_col + 1):
+            tgt.cell(row=r - start_row + tgt_start_row, column=c).value = src.cell(row=r, column=c).value
+        if time.perf_counter() > deadline:
+            return r - start_row + 1, max_row - start_row + 1
+    return max_row - start_row + 1, max_row - start_row + 1
+
+
+def estimate_cellwise(src, start_row, samples=5):
+    """Sum of interpolated single-cell read costs over every cell the old copy reads"""
+    max_row, max_col = get_safe_dimensions(src)
+    points = sorted({start_row + (max_row - start_row) * i // (samples - 1) for i in range(samples)})
+    costs = []
+    for r in points:
+        start = time.perf_counter()
+        src.cell(row=r, column=max_col).value
+        costs.append(time.perf_counter() - start)
+
+    total = 0.0
+    for (r0, c0), (r1, c1) in zip(zip(points, costs), zip(points[1:], costs[1:])):
+        # Trapezoid over rows r0..r1-1, then the final row on its own
+        total += (c0 + c1) / 2 * (r1 - r0)
+    total += costs[-1]
+    return total * max_col
+
+
+def run_size(tmp_dir, n_rows, n_cols, budget):
+    path = os.path.join(tmp_dir, f"order_level_{n_rows}.xlsx")
+    make_invoice(path, n_rows, n_cols)
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    new_ws = openpyxl.Workbook().active
+    start = time.perf_counter()
+    copy_data(wb["Order Level"], new_ws, SRC_START_ROW, tgt_start_row=TGT_START_ROW)
+    new_time = time.perf_counter() - start
+    wb.close()
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    reused_ws = make_reused_target(n_rows, n_cols)
+    start = time.perf_counter()
+    copy_data(wb["Order Level"], reused_ws, SRC_START_ROW, tgt_start_row=TGT_START_ROW)
+    reused_time = time.perf_counter() - start
+    wb.close()
+    fresh_rows = list(new_ws.iter_rows(values_only=True))
+    assert list(reused_ws.iter_rows(values_only=True)) == fresh_rows, f"Reused target differs at {n_rows} rows"
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    old_ws = openpyxl.Workbook().active
+    start = time.perf_counter()
+    done, total = copy_data_cellwise(wb["Order Level"], old_ws, SRC_START_ROW, TGT_START_ROW, budget)
+    old_time = time.perf_counter() - start
+    estimated = done < total
+    if estimated:
+        old_time = estimate_cellwise(wb["Order Level"], SRC_START_ROW)
+    wb.close()
+
+    last_row = TGT_START_ROW + done - 1
+    old_rows = list(old_ws.iter_rows(min_row=1, max_row=last_row, values_only=True))
+    new_rows = list(new_ws.iter_rows(min_row=1, max_row=last_row, max_col=old_ws.max_column, values_only=True))
+    assert old_rows == new_rows, f"Copies differ at {n_rows} rows"
+    return old_time, new_time, reused_time, estimated, done
+
+
+def main():
+    args = sys.argv[1:]
+    n_cols, budget, sizes = 30, 60.0, []
+    while args:
+        arg = args.pop(0)
+        if arg == "--cols":
+            n_cols = int(args.pop(0))
+        elif arg == "--budget":
+            budget = float(args.pop(0))
+        else:
+            sizes.append(int(arg))
+    sizes = sizes or [1000, 10000, 50000]
+
+    print(f"Swiggy copy_data, {n_cols} cols, old copy budget {budget:.0f}s per size")
+    print(f"  {'rows':>8}  {'old (cell)':>14}  {'new (stream)':>12}  {'new (reused)':>12}  {'speed-up':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in sizes:
+            old_time, new_time, reused_time, estimated, checked = run_size(tmp_dir, n_rows, n_cols, budget)
+            old_label = f"{old_time:9.2f}s" + (" est." if estimated else "     ")
+            print(f"  {n_rows:>8,}  {old_label:>14}  {new_time:11.2f}s  {reused_time:11.2f}s  {old_time / new_time:8.0f}x"
+                  f"  ({checked:,} rows checked identical)")
+
+
+if __name__ == "__main__":
+    main()
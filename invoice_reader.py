@@ -0,0 +1,169 @@
+"""
+Projected reads of invoice sheets.
+Engines name the header columns they actually use, plus an optional row
+predicate, and get back just those columns of the rows that pass instead of
+holding every cell of the 80+ column Order Level sheets. With columns=None
+every column is kept, for the raw D1W / calculation sheet dumps.
+
+Workbooks come from one of two backends (READER_BACKENDS): openpyxl's
+read-only mode, or the xlsx_stream XML reader, which also skips decoding
+the cells of columns nobody reads.
+"""
+
+import openpyxl
+
+from xlsx_stream import StreamSheet, StreamWorkbook
+
+READER_BACKENDS = ("openpyxl", "xml")
+
+
+def open_invoice_workbook(source, backend="openpyxl"):
+    """Read-only workbook of cached cell values (path or binary stream) from a READER_BACKENDS backend"""
+    if backend == "xml":
+        return StreamWorkbook(source)
+    if backend != "openpyxl":
+        raise ValueError(f"Unknown reader backend {backend!r} (expected one of {READER_BACKENDS})")
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+
+def normalize_header(value):
+    return str(value or "").strip().lower()
+
+
+def header_matcher(spec):
+    """
+    A column spec as a test on normalized header text: a string matches that
+    header exactly (case and surrounding spaces ignored), a callable is used as-is.
+    """
+    if callable(spec):
+        return spec
+    wanted = normalize_header(spec)
+    return lambda text: text == wanted
+
+
+def header_contains(*keywords):
+    """Column spec matching headers that contain every keyword (case-insensitive)"""
+    keywords = [k.lower() for k in keywords]
+    return lambda text: all(k in text for k in keywords)
+
+
+class ColumnProjection:
+    """
+    The columns of a header row an engine keeps: every column whose header
+    matches one of `columns`, plus the first `leading` columns, in sheet order.
+    columns=None keeps the row as-is (raw copy).
+    """
+
+    def __init__(self, header, columns=None, leading=0):
+        self.source_header = tuple(header)
+        if columns is None:
+            self.positions = None
+            self.header = self.source_header
+            return
+
+        matchers = [header_matcher(spec) for spec in columns]
+        keep = set(range(min(leading, len(self.source_header))))
+        for idx, value in enumerate(self.source_header):
+            text = normalize_header(value)
+            if text and any(match(text) for match in matchers):
+                keep.add(idx)
+        self.positions = sorted(keep)
+        self.header = tuple(self.source_header[idx] for idx in self.positions)
+
+    @property
+    def is_raw(self):
+        return self.positions is None
+
+    def __len__(self):
+        return len(self.header)
+
+    def __call__(self, row):
+        """Projected copy of a source row (missing trailing cells become None)"""
+        if self.positions is None:
+            return row
+        width = len(row)
+        return tuple(row[idx] if idx < width else None for idx in self.positions)
+
+
+class SheetReader:
+    """
+    One streaming pass over a sheet whose header sits on header_row.
+
+        reader = SheetReader(ws, 7, columns=["order date", "subtotal (items total)"])
+        date_idx = reader.source_index("order date")
+        for row in reader.rows(where=lambda row: row[date_idx] is not None):
+            ...
+
+    The header is read on construction, so predicates can be built from
+    source_index() before the data rows are streamed. rows() can only be
+    iterated once.
+
+    On a StreamSheet only the projected columns and the `reads` specs (the
+    columns the predicates look at) are decoded; other cells reach the
+    predicates as None.
+    """
+
+    def __init__(self, sheet, header_row, columns=None, leading=0, reads=()):
+        if not isinstance(sheet, StreamSheet):
+            self._rows = sheet.iter_rows(min_row=header_row, values_only=True)
+            self.projection = ColumnProjection(next(self._rows, ()), columns, leading)
+            return
+
+        header = next(sheet.iter_rows(min_row=header_row, max_row=header_row, values_only=True), ())
+        self.projection = ColumnProjection(header, columns, leading)
+        decode = None
+        if not self.projection.is_raw:
+            read_positions = ColumnProjection(header, reads).positions
+            decode = {idx + 1 for idx in self.projection.positions + read_positions}
+        self._rows = sheet.iter_rows(min_row=header_row + 1, values_only=True, decode=decode)
+
+    @property
+    def header(self):
+        """Header of the rows rows() yields (projected)"""
+        return self.projection.header
+
+    @property
+    def source_header(self):
+        return self.projection.source_header
+
+    def source_index(self, spec, last=False):
+        """0-based position in the source row of the first (or last) header matching spec, or None"""
+        match = header_matcher(spec)
+        found = None
+        for idx, value in enumerate(self.source_header):
+            if match(normalize_header(value)):
+                found = idx
+                if not last:
+                    break
+        return found
+
+    def rows(self, where=None, on_skip=None):
+        """
+        Yield the projected data rows. where(row) sees each source row first:
+        rows it rejects go to on_skip(row), if given, and are never projected.
+        """
+        project = self.projection
+        if where is None:
+            if project.is_raw:
+                yield from self._rows
+            else:
+                for row in self._rows:
+                    yield project(row)
+            return
+
+        for row in self._rows:
+            if where(row):
+                yield project(row)
+            elif on_skip is not None:
+                on_skip(row)
+
+    def keyed_rows(self, key):
+        """
+        Like rows(where=key), but yields (key(row), projected row) so a row can
+        be routed by what the predicate found (e.g. the weeks its date falls in).
+        """
+        project = self.projection
+        for row in self._rows:
+            found = key(row)
+            if found:
+                yield found, project(row)
@@ -0,0 +1,330 @@
+"""
+Background job queue for reconciliation uploads.
+Upload routes enqueue the platform engine and return a job id at once;
+a bounded pool of worker threads tracks each job and, in 'process' mode,
+hands the openpyxl work to a pool of engine processes so concurrent
+reconciliations use every core instead of sharing one GIL.
+"""
+
+import io
+import multiprocessing
+import queue
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Modules every engine process imports up front, so the first job a
+# worker picks up does not pay for loading openpyxl/pandas.
+ENGINE_MODULES = [
+    'openpyxl',
+    'pandas',
+    'process_invoices',
+    'swiggy_process',
+    'swiggy_dineout_process',
+    'zomato_pay_process',
+    'zomato_consolidated_process',
+    'paytm_process',
+]
+
+_progress_queue = None  # Set in each engine process by _init_engine_process
+
+
+class QueueFullError(Exception):
+    """Raised when the job backlog is already at capacity"""
+
+
+class UploadedFile:
+    """
+    Picklable stand-in for werkzeug's FileStorage (engine processes get a copy).
+    Holds the upload's bytes, or with path= the file it was spilled to, which is
+    opened on first use in whichever process reads it.
+    """
+
+    def __init__(self, filename, data=b'', content_type=None, path=None):
+        self.filename = filename
+        self.content_type = content_type
+        self.path = path
+        self._stream = None if path else io.BytesIO(data)
+
+    @property
+    def stream(self):
+        if self._stream is None:
+            self._stream = open(self.path, 'rb')
+        return self._stream
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path:
+            state['_stream'] = None  # File handles do not pickle; reopened from the path
+        return state
+
+    def close(self):
+        if self.path and self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def read(self, *args):
+        return self.stream.read(*args)
+
+    def seek(self, *args):
+        return self.stream.seek(*args)
+
+    def save(self, dst):
+        """Write the upload to a path or file object, like FileStorage.save"""
+        self.stream.seek(0)
+        if isinstance(dst, str):
+            with open(dst, 'wb') as f:
+                shutil.copyfileobj(self.stream, f)
+        else:
+            shutil.copyfileobj(self.stream, dst)
+
+
+def _init_engine_process(progress_queue, modules):
+    """Engine process initializer: keep the progress channel and pre-import engines"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    for name in modules:
+        try:
+            __import__(name)
+        except Exception as e:
+            print(f"⚠️  Engine process could not pre-import {name}: {e}")
+
+
+def _run_in_engine_process(job_id, target, args, kwargs, progress_arg):
+    """Runs inside an engine process; progress is relayed back to the web process"""
+    if progress_arg:
+        kwargs[progress_arg] = lambda p: _progress_queue.put((job_id, p))
+    return target(*args, **kwargs)
+
+
+class Job:
+    """Status record for one submitted reconciliation"""
+
+    def __init__(self, job_id, kind, task_id=None, output_path=None):
+        self.job_id = job_id
+        self.kind = kind
+        self.task_id = task_id
+        self.output_path = output_path
+        self.status = 'queued'  # queued -> running -> done / failed
+        self.progress = 0
+        self.message = 'Waiting for a free worker'
+        self.result = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        data = {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+        }
+        # Route specific payload (download_url, weeks_processed, traceback...)
+        data.update(self.result)
+        data['success'] = self.status != 'failed'
+        return data
+
+
+class JobQueue:
+    """
+    Bounded worker pool for the platform engines.
+
+    max_workers  - engines allowed to run at the same time
+    max_pending  - jobs allowed to wait for a worker before submit() refuses
+    job_ttl      - seconds a finished job stays queryable
+    executor     - 'process' runs engines in worker processes, 'thread' in this process
+    progress_listener(task_id, progress) - optional hook for per-task progress tracking
+    status_listener(job) - optional hook called when a job is queued, starts and finishes
+
+    In process mode the engine target, its arguments and its return value
+    must be picklable; finalize/cleanup callbacks still run in this process.
+    """
+
+    def __init__(self, max_workers=2, max_pending=20, job_ttl=3600, executor='thread',
+                 progress_listener=None, status_listener=None):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown job executor '{executor}' (expected 'thread' or 'process')")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.executor = executor
+        self.progress_listener = progress_listener
+        self.status_listener = status_listener
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Threads only wait on engines (or run them in 'thread' mode)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recon-job')
+        self._process_pool = None
+        self._progress_queue = None
+        self._pool_lock = threading.Lock()
+
+    def submit(self, kind, target, args=(), kwargs=None, finalize=None, cleanup=None,
+               task_id=None, output_path=None, progress_arg='progress_callback'):
+        """
+        Queue target(*args, **kwargs) and return its Job immediately.
+
+        finalize(result) turns the engine's return value into the response payload
+        (must contain 'success'); cleanup() always runs once the job has finished.
+        """
+        with self._lock:
+            self._evict_expired()
+            unfinished = sum(1 for j in self._jobs.values() if not j.finished)
+            if unfinished >= self.max_workers + self.max_pending:
+                raise QueueFullError('Server is busy processing other reconciliations. Please retry in a few minutes.')
+
+            job = Job(str(uuid.uuid4()), kind, task_id=task_id, output_path=output_path)
+            self._jobs[job.job_id] = job
+
+        self._notify_status(job)
+        self._executor.submit(self._run, job, target, tuple(args), dict(kwargs or {}), finalize, cleanup, progress_arg)
+        print(f"📥 Queued {kind} job {job.job_id} ({unfinished + 1} unfinished)")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def unfinished_count(self):
+        """Jobs queued or running right now"""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if not j.finished)
+
+    def update_progress(self, job, progress):
+        """Record engine progress on the job (never moves backwards)"""
+        try:
+            progress = int(progress)
+        except (TypeError, ValueError):
+            return
+        if progress > job.progress:
+            job.progress = min(progress, 100)
+        if self.progress_listener and job.task_id:
+            self.progress_listener(job.task_id, job.progress)
+
+    def _run(self, job, target, args, kwargs, finalize, cleanup, progress_arg):
+        job.status = 'running'
+        job.message = 'Processing'
+        job.started_at = time.time()
+        self._notify_status(job)
+        print(f"▶️  Started {job.kind} job {job.job_id}")
+
+        try:
+            if self.executor == 'process':
+                result = self._run_in_process_pool(job, target, args, kwargs, progress_arg)
+            else:
+                if progress_arg:
+                    kwargs[progress_arg] = lambda p: self.update_progress(job, p)
+                result = target(*args, **kwargs)
+            payload = finalize(result) if finalize else result
+            if not isinstance(payload, dict):
+                payload = {'success': bool(payload)}
+
+            job.result = {k: v for k, v in payload.items() if k not in ('success', 'message')}
+            job.message = payload.get('message', '')
+            if payload.get('success'):
+                job.status = 'done'
+                self.update_progress(job, 100)
+            else:
+                job.status = 'failed'
+                job.message = job.message or 'Processing failed'
+        except Exception as e:
+            error_details = traceback.format_exc()
+            print(f"❌ {job.kind} job {job.job_id} crashed:\n{error_details}")
+            job.status = 'failed'
+            job.message = f"Processing Error: {str(e)}"
+            job.result = {'traceback': error_details}
+        finally:
+            job.finished_at = time.time()
+            if cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"⚠️  Cleanup failed for job {job.job_id}: {e}")
+            self._notify_status(job)
+
+        print(f"🏁 {job.kind} job {job.job_id} {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+    def _notify_status(self, job):
+        if self.status_listener:
+            try:
+                self.status_listener(job)
+            except Exception as e:
+                print(f"⚠️  Status listener failed for job {job.job_id}: {e}")
+
+    def _run_in_process_pool(self, job, target, args, kwargs, progress_arg):
+        pool = self._get_process_pool()
+        future = pool.submit(_run_in_engine_process, job.job_id, target, args, kwargs, progress_arg)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # A worker died (usually out of memory); start a fresh pool for later jobs
+            self._reset_process_pool(pool)
+            raise RuntimeError('Engine process terminated unexpectedly (file may be too large)')
+
+    def _get_process_pool(self):
+        with self._pool_lock:
+            if self._process_pool is None:
+                # spawn: never fork a multi-threaded web process
+                ctx = multiprocessing.get_context('spawn')
+                self._progress_queue = ctx.Queue()
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=ctx,
+                    initializer=_init_engine_process,
+                    initargs=(self._progress_queue, ENGINE_MODULES)
+                )
+                threading.Thread(target=self._relay_progress, args=(self._progress_queue,),
+                                 name='recon-job-progress', daemon=True).start()
+                print(f"⚙️  Started engine process pool ({self.max_workers} workers)")
+            return self._process_pool
+
+    def _reset_process_pool(self, broken_pool):
+        with self._pool_lock:
+            if self._process_pool is broken_pool:
+                self._process_pool = None
+                self._progress_queue.put(None)  # Stop the old relay thread
+                self._progress_queue = None
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _relay_progress(self, progress_queue):
+        """Forward progress updates from engine processes to their jobs"""
+        while True:
+            try:
+                items = [progress_queue.get()]
+                # Coalesce a burst of updates: only the latest value per job matters
+                while True:
+                    try:
+                        items.append(progress_queue.get_nowait())
+                    except queue.Empty:
+                        break
+            except (EOFError, OSError):
+                return
+
+            latest = {}
+            for item in items:
+                if item is None:
+                    break
+                job_id, progress = item
+                latest[job_id] = progress
+            for job_id, progress in latest.items():
+                job = self.get(job_id)
+                if job and not job.finished:
+                    self.update_progress(job, progress)
+            if None in items:
+                return
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.job_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
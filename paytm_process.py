@@ -1,11 +1,12 @@
 import openpyxl
+import numpy as np
 import pandas as pd
 import shutil
 import os
 import gc
 import re
 from datetime import datetime
-from process_invoices import calculate_week_structure, ordinal, parse
+from process_invoices import calculate_week_structure, ordinal, DateColumnParser
 
 def get_safe_dimensions(sheet):
     """Safe way to get max_row and max_column in read_only mode"""
@@ -32,8 +33,83 @@ def safe_float(val):
     except:
         return 0.0
 
+PAYTM_CHUNK_ROWS = 50000  # CSV rows read, pasted and aggregated at a time
+
+def write_frame_header(ws, columns, header_row):
+    """Column headers on header_row, clearing anything below so the appends that follow land right under it"""
+    if ws.max_row > header_row:
+        ws.delete_rows(header_row + 1, ws.max_row - header_row)
+    for col_num, h in enumerate(columns, 1):
+        ws.cell(row=header_row, column=col_num).value = h
+
+def append_frame(ws, df):
+    """
+    One append per DataFrame row. Columns go through Series.tolist(),
+    so NumPy scalars land as native Python values.
+    """
+    columns = [df.iloc[:, idx].tolist() for idx in range(df.shape[1])]
+    for row in zip(*columns):
+        ws.append(row)
+
+def write_frame(ws, df, header_row):
+    """Paste a DataFrame into ws: column headers on header_row, data rows below"""
+    write_frame_header(ws, df.columns.tolist(), header_row)
+    append_frame(ws, df)
+
+def iter_paytm_frames(path, chunk_rows=PAYTM_CHUNK_ROWS):
+    """
+    DataFrames of one export, in row order. CSVs are streamed chunk_rows at a time;
+    xlsx sheets (capped by Excel at ~1M rows) are read whole.
+    """
+    if path.lower().endswith('.csv'):
+        with pd.read_csv(path, chunksize=chunk_rows) as reader:
+            yield from reader
+    else:
+        yield pd.read_excel(path)
+
+def find_paytm_columns(headers):
+    """Positions of the status, amount, commission and transaction_date columns (-1 if missing)"""
+    status_col, amount_col, commission_col, date_col = -1, -1, -1, -1
+    for idx, h in enumerate(headers):
+        h_clean = str(h).strip().lower()
+        if h_clean == "status": status_col = idx
+        if h_clean == "amount": amount_col = idx
+        if h_clean == "commission": commission_col = idx
+        if h_clean == "transaction_date": date_col = idx
+    return status_col, amount_col, commission_col, date_col
+
+def amount_column(col):
+    """safe_float over a whole column: numeric columns are cast directly, text is cleaned per value"""
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.to_numpy(dtype=np.float64)
+    return np.fromiter((safe_float(v) for v in col), dtype=np.float64, count=len(col))
+
+def assign_weeks(row_dates, week_structure):
+    """
+    Position in week_structure of each row's date, or -1 (no date / outside every week).
+    Weeks can overlap at the end of the month; as with a linear scan, the first one wins.
+    """
+    days = np.array([d.toordinal() if d is not None else -1 for d in row_dates], dtype=np.int64)
+    week_pos = np.full(len(days), -1, dtype=np.int64)
+    for pos in range(len(week_structure) - 1, -1, -1):
+        week = week_structure[pos]
+        start, end = week['start_date'].toordinal(), week['end_date'].toordinal()
+        week_pos[(days >= start) & (days <= end)] = pos
+    return week_pos
+
+def add_weekly_sums(running, week_pos, values):
+    """
+    running (one total per week) plus values summed by week_pos (-1 rows skipped).
+    Each total starts from its running value and adds rows in order, so folding
+    chunk after chunk gives exactly the same floats as one pass over every row.
+    """
+    counted = week_pos >= 0
+    groups = np.concatenate([np.arange(len(running)), week_pos[counted]])
+    weights = np.concatenate([running, values[counted]])
+    return np.bincount(groups, weights=weights, minlength=len(running))
+
 def process_paytm(
-    invoice_path,
+    invoice_paths,
     template_path,
     output_path,
     client_name="Client",
@@ -42,10 +118,13 @@ def process_paytm(
     first_week_end=None,
     last_week_start=None,
     last_week_end=None,
-    progress_callback=None
+    progress_callback=None,
+    chunk_rows=PAYTM_CHUNK_ROWS
 ):
     """
     Paytm Reconciliation Logic.
+    invoice_paths: one or more xlsx/csv exports for the month (a single path also works);
+    their rows are pasted and aggregated one chunk at a time.
     """
     try:
         if progress_callback: progress_callback(10)
@@ -64,77 +143,61 @@ def process_paytm(
 
         if progress_callback: progress_callback(20)
 
-        # 2. Load Source Data
-        if invoice_path.lower().endswith('.csv'):
-            df_src = pd.read_csv(invoice_path)
-        else:
-            df_src = pd.read_excel(invoice_path)
-
-        # 3. Paste data to Paytm Calculations starting A10
-        # Headers at row 10
-        headers = df_src.columns.tolist()
-        for idx, h in enumerate(headers, 1):
-            ws_calc.cell(row=10, column=idx).value = h
-            
-        # Data from row 11 onwards
-        for r_idx, row in enumerate(df_src.values, 11):
-            for c_idx, val in enumerate(row, 1):
-                ws_calc.cell(row=r_idx, column=c_idx).value = val
-
-        if progress_callback: progress_callback(40)
-
-        # 4. Identify Columns in Row 10
-        status_col, amount_col, commission_col, date_col = -1, -1, -1, -1
-        for idx, h in enumerate(headers):
-            h_clean = str(h).strip().lower()
-            if h_clean == "status": status_col = idx
-            if h_clean == "amount": amount_col = idx
-            if h_clean == "commission": commission_col = idx
-            if h_clean == "transaction_date": date_col = idx
-
-        if -1 in [status_col, amount_col, commission_col, date_col]:
-            return {'success': False, 'message': f'Required columns not found. Found: Status={status_col}, Amount={amount_col}, Commission={commission_col}, Date={date_col}'}
-
-        # 5. Calculate Week Structure
+        # 2. Calculate Week Structure
         week_structure = calculate_week_structure(month, first_week_start, first_week_end, last_week_start, last_week_end)
-        
-        # 6. Aggregate Week Wise
+
+        # 3. Stream every export: paste rows to Paytm Calculations (headers at row 10, data from
+        # row 11) and fold SUCCESS rows into running per-week sums
         # G2, H2, etc for Amount (100/105)
         # G3, H3, etc for Commission (1.18)
-        
-        weekly_stats = {w['week_num']: {'amt': 0.0, 'comm': 0.0, 'label': w['label']} for w in week_structure}
-        
-        for idx, row in df_src.iterrows():
-            # Check Status
-            status = str(row.iloc[status_col]).strip().upper().replace("'", "")
-            if status != "SUCCESS": continue
-            
-            # Check Date
-            date_val = str(row.iloc[date_col]).replace("'", "").strip()
-            try:
-                row_date_dt = parse(date_val)
-                row_date = row_date_dt.date()
-            except:
-                continue
-                
-            # Match to Week
-            for week in week_structure:
-                if week['start_date'].date() <= row_date <= week['end_date'].date():
-                    wn = week['week_num']
-                    weekly_stats[wn]['amt'] += safe_float(row.iloc[amount_col])
-                    weekly_stats[wn]['comm'] += safe_float(row.iloc[commission_col])
-                    break
-
-        # 7. Write results to Paytm Calculations
+        if isinstance(invoice_paths, str): invoice_paths = [invoice_paths]
+        amt_sums = np.zeros(len(week_structure))
+        comm_sums = np.zeros(len(week_structure))
+        date_parser = DateColumnParser()  # Shared, so dates repeating across chunks parse once
+        headers = None
+
+        for file_num, invoice_path in enumerate(invoice_paths, 1):
+            for df_src in iter_paytm_frames(invoice_path, chunk_rows):
+                # 4. Identify Columns (per chunk; later files may order them differently)
+                status_col, amount_col, commission_col, date_col = find_paytm_columns(df_src.columns)
+                if -1 in [status_col, amount_col, commission_col, date_col]:
+                    return {'success': False, 'message': f'Required columns not found in {os.path.basename(invoice_path)}. Found: Status={status_col}, Amount={amount_col}, Commission={commission_col}, Date={date_col}'}
+
+                if headers is None:
+                    headers = df_src.columns.tolist()
+                    write_frame_header(ws_calc, headers, header_row=10)
+                if df_src.columns.tolist() != headers:
+                    print(f"⚠️  {os.path.basename(invoice_path)}: columns differ from the first export, pasted under its headers")
+                    append_frame(ws_calc, df_src.reindex(columns=headers))
+                else:
+                    append_frame(ws_calc, df_src)
+
+                # Check Status
+                status = df_src.iloc[:, status_col].astype(str).str.strip().str.upper().str.replace("'", "")
+                success = (status == "SUCCESS").to_numpy()
+
+                # Parse the whole date column at once (dates repeat across transactions), then match to weeks
+                row_dates = date_parser.parse_column(
+                    str(v).replace("'", "").strip() for v in df_src.iloc[:, date_col]
+                )
+                week_pos = np.where(success, assign_weeks(row_dates, week_structure), -1)
+
+                amt_sums = add_weekly_sums(amt_sums, week_pos, amount_column(df_src.iloc[:, amount_col]))
+                comm_sums = add_weekly_sums(comm_sums, week_pos, amount_column(df_src.iloc[:, commission_col]))
+
+            if progress_callback: progress_callback(20 + 50 * file_num // len(invoice_paths))
+
+        weekly_stats = {w['week_num']: {'amt': float(amt_sums[pos]), 'comm': float(comm_sums[pos]), 'label': w['label']}
+                        for pos, w in enumerate(week_structure)}
+
+        # 5. Write results to Paytm Calculations
         for wn, stats in weekly_stats.items():
             col = 7 + (wn - 1) # G, H, I...
             ws_calc.cell(row=2, column=col).value = stats['amt'] * 100.0 / 105.0
             ws_calc.cell(row=3, column=col).value = stats['comm'] * 1.18
             ws_calc.cell(row=1, column=col).value = f"Week {wn}"
 
-        if progress_callback: progress_callback(70)
-
-        # 8. Map to Paytm Reconciliation
+        # 6. Map to Paytm Reconciliation
         # Client Name in A1
         ws_recon["A1"].value = client_name
 
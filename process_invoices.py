@@ -1,5 +1,8 @@
+import numpy as np
 import openpyxl
+import pandas as pd
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import from_excel
 
 def get_safe_dimensions(sheet):
     """Safe way to get max_row and max_column in read_only mode"""
@@ -29,15 +32,34 @@ import shutil
 import os
 import time
 import gc
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import calendar
 import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from invoice_reader import SheetReader, header_contains, open_invoice_workbook
 
 # ===================== ZOMATO-SPECIFIC HELPERS =====================
 
+DATE_FORMATS = [
+    "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d",
+    "%d %B %Y", "%d %b %Y", "%d.%m.%Y",
+    "%Y/%m/%d", "%d %B", "%d %b"
+]
+# 'YYYY-MM-DD hh:mm...' never matches DATE_FORMATS and always lands in the
+# digit fallback below, which keeps just the date part
+ISO_DATETIME_RE = re.compile(r'(\d{4})-(\d+)-(\d+)[ T]\d')
+EXCEL_SERIAL_MIN = 32  # Smaller numbers are treated as a bare day of month
+
+
 def parse(date_str, dayfirst=True):
     """Robust date parser avoiding hardcoded year-as-day bugs"""
     if isinstance(date_str, (int, float)):
+        if date_str >= EXCEL_SERIAL_MIN:
+            # Excel serial date (unformatted date cell)
+            dt = from_excel(date_str)
+            return datetime(dt.year, dt.month, dt.day)
         # Default to current year/month if only a day is provided
         return datetime(datetime.now().year, datetime.now().month, min(max(1, int(date_str)), 28))
 
@@ -45,23 +67,27 @@ def parse(date_str, dayfirst=True):
     if not date_str or date_str == '#REF!':
         raise ValueError("Empty date string")
 
+    return _parse_date_text(date_str)[0]
+
+
+def _parse_date_text(date_str, first_format=None):
+    """Parse stripped text; returns (datetime, format used or None for the fallbacks)"""
     if date_str.isdigit():
         d = int(date_str)
-        return datetime(2025, 1, min(max(1, d), 31))
+        return datetime(2025, 1, min(max(1, d), 31)), None
 
-    # Try common date formats
-    formats = [
-        "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d",
-        "%d %B %Y", "%d %b %Y", "%d.%m.%Y",
-        "%Y/%m/%d", "%d %B", "%d %b"
-    ]
+    # Try common date formats (they never accept the same text differently,
+    # so trying a previously successful one first gives the same answer)
+    formats = DATE_FORMATS
+    if first_format:
+        formats = [first_format] + [f for f in DATE_FORMATS if f != first_format]
 
     for fmt in formats:
         try:
             dt = datetime.strptime(date_str, fmt)
             if dt.year == 1900: # Year missing in format
                 dt = dt.replace(year=datetime.now().year)
-            return dt
+            return dt, fmt
         except:
             continue
 
@@ -71,15 +97,123 @@ def parse(date_str, dayfirst=True):
         if len(numbers) >= 3:
             # Try to guess YMD or DMY
             if len(numbers[0]) == 4: # YYYY-MM-DD
-                return datetime(int(numbers[0]), int(numbers[1]), int(numbers[2]))
+                return datetime(int(numbers[0]), int(numbers[1]), int(numbers[2])), None
             else: # DD-MM-YYYY
-                return datetime(int(numbers[2]), int(numbers[0]), int(numbers[1]))
+                return datetime(int(numbers[2]), int(numbers[0]), int(numbers[1])), None
     except:
         pass
 
     raise ValueError(f"Cannot parse date: {date_str}")
 
 
+class DateColumnParser:
+    """
+    parse() for row-level date columns, where the same few dates repeat
+    thousands of times.
+
+    - results are cached per distinct value (failures too)
+    - datetime/date cells and Excel serials are converted directly
+    - the text format is inferred from the values seen so far and tried first
+    - parse_column() parses a whole column, vectorized through pandas when
+      the inferred format allows it
+
+    Every value gets the same result as parse() would give (None where
+    parse() raises).
+    """
+
+    VECTORIZE_MIN = 500  # Distinct strings before the pandas path pays off
+
+    def __init__(self):
+        self._cache = {}
+        self._format = None
+
+    def __call__(self, value):
+        """Parse one value; raises ValueError like parse() when it cannot"""
+        result = self.get(value)
+        if result is None:
+            raise ValueError(f"Cannot parse date: {value}")
+        return result
+
+    def get(self, value):
+        """Parse one value, or None if it cannot be parsed"""
+        if isinstance(value, datetime):
+            # parse(str(dt)) keeps only the date part
+            return datetime(value.year, value.month, value.day)
+        if isinstance(value, date):
+            # parse(str(d)) goes through "%Y-%m-%d", including its year-1900 rule
+            return datetime(datetime.now().year if value.year == 1900 else value.year, value.month, value.day)
+
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+        except TypeError:  # Unhashable, just parse it
+            return self._parse(value)
+
+        result = self._parse(value)
+        self._cache[value] = result
+        return result
+
+    def _parse(self, value):
+        if not isinstance(value, str):
+            try:
+                return parse(value)
+            except Exception:
+                return None
+
+        text = value.strip()
+        if not text or text == '#REF!':
+            return None
+        m = ISO_DATETIME_RE.match(text)
+        if m:
+            try:
+                return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            except ValueError:
+                return None
+        try:
+            dt, fmt = _parse_date_text(text, self._format)
+        except Exception:
+            return None
+        if fmt:
+            self._format = fmt
+        return dt
+
+    def parse_column(self, values):
+        """Parse a sequence of values; returns a list of datetimes (None where unparseable)"""
+        values = list(values)
+        pending = []
+        seen = set()
+        for v in values:
+            if isinstance(v, str) and v not in self._cache and v not in seen:
+                seen.add(v)
+                pending.append(v)
+
+        if len(pending) >= self.VECTORIZE_MIN:
+            self._parse_strings_vectorized(pending)
+
+        return [self.get(v) for v in values]
+
+    def _parse_strings_vectorized(self, strings):
+        """Fill the cache for many distinct strings at once"""
+        # Infer the dominant format from a sample
+        for s in strings[:20]:
+            self.get(s)
+
+        stripped = pd.Series(strings, dtype=object).str.strip()
+        iso = stripped.str.match(ISO_DATETIME_RE.pattern)
+        if iso.all():
+            parsed = pd.to_datetime(stripped.str.slice(0, 10), format="%Y-%m-%d", errors='coerce')
+        elif self._format and "%Y" in self._format:
+            parsed = pd.to_datetime(stripped, format=self._format, errors='coerce')
+        else:
+            return  # Left to the cached scalar path
+
+        for s, ts in zip(strings, parsed):
+            # NaT and year 1900 (parse() swaps in the current year) use the scalar path
+            if not pd.isna(ts) and ts.year != 1900:
+                self._cache[s] = datetime(ts.year, ts.month, ts.day)
+
+
 def calculate_week_structure(month, first_week_start, first_week_end, last_week_start, last_week_end):
     """
     Calculate complete week structure with spillover handling
@@ -459,63 +593,192 @@ def ensure_sheet(wb, name):
         return wb.create_sheet(name)
 
 
-def copy_data_with_spillover_filter(src, tgt, start_row, target_month=None, week_info=None, cashflow_sheet=None):
-    """Smart copy: Filter by target month + calculate spillover adjustments."""
+D1W_HEADER_ROW = 5  # D1W layout: rows 1-4 aggregates, row 5 header, orders from row 6
+ORDER_COUNT_COLUMNS = 5  # Total orders = last row with anything in columns A-E
+ORDER_STATUS_HEADER = "order status (delivered/ cancelled/ rejected)"
+SUBTOTAL_HEADER = "subtotal (items total)"
+CANCELLED_STATUSES = ["CANCELLED", "TIMEDOUT", "TIMEOUT", "REJECTED"]
+
+
+def sum_by_order_status(rows, status_idx, item_total_idx, width):
+    """
+    Cancelled/delivered sums of every column from 'Subtotal (items total)' to width.
+    The numeric block is loaded once into a float matrix (non-numeric cells are 0)
+    and summed per column under DELIVERED / CANCELLED-like status masks.
+    Returns (cancelled, delivered, skipped_rows) as plain Python numbers.
+    """
+    n_cols = width - item_total_idx
+    statuses = np.array(
+        [str((row[status_idx] if status_idx < len(row) else None) or "").upper().strip() for row in rows],
+        dtype=object
+    )
+    delivered_mask = statuses == "DELIVERED"
+    cancelled_mask = np.isin(statuses, CANCELLED_STATUSES)
+    skipped_rows = int(len(rows) - delivered_mask.sum() - cancelled_mask.sum())
+
+    block = np.zeros((len(rows), n_cols))
+    for r, row in enumerate(rows):
+        values = [v if isinstance(v, (int, float)) else 0 for v in row[item_total_idx:width]]
+        block[r, :len(values)] = values
+
+    # Columns holding only whole numbers keep int totals, as the old loop did
+    integral = np.all(np.isfinite(block) & (block == np.trunc(block)), axis=0)
+
+    def to_python(sums):
+        return [int(v) if is_int else float(v) for v, is_int in zip(sums.tolist(), integral)]
+
+    cancelled = to_python(block[cancelled_mask].sum(axis=0))
+    delivered = to_python(block[delivered_mask].sum(axis=0))
+    return cancelled, delivered, skipped_rows
+
+
+class OrderLevelTotals:
+    """
+    Rows kept for a D1W sheet plus every figure the Cashflow/Summary mapping
+    needs from them (order count, compensation count, delivered/cancelled
+    column sums, commissionable value), accumulated as the rows stream in.
+    Header matching mirrors the old per-sheet scans exactly.
+    """
+
+    def __init__(self, header):
+        self.header = list(header)
+        self.rows = []
+        self.width = len(self.header)
+
+        self.status_idx = None
+        self.item_total_idx = None
+        self.compensation_idx = None
+        self.commissionable_idx = None
+        for idx, value in enumerate(self.header):
+            header_lower = str(value or "").lower()
+            header_clean = header_lower.strip()
+            if header_lower == ORDER_STATUS_HEADER:
+                self.status_idx = idx
+            if header_lower == SUBTOTAL_HEADER:
+                self.item_total_idx = idx
+            if self.compensation_idx is None and "customer compensation" in header_clean and "recoupment" in header_clean:
+                self.compensation_idx = idx
+            if self.commissionable_idx is None and "commissionable value" in header_clean:
+                self.commissionable_idx = idx
+
+        self.compensation_orders = 0
+        self.last_order_idx = -1
+        self._sums = None
+
+    @property
+    def has_calculations(self):
+        return self.item_total_idx is not None and self.status_idx is not None
+
+    def add(self, row):
+        """Keep one order row and fold it into the running counts"""
+        self._sums = None
+        idx = len(self.rows)
+        self.rows.append(row)
+        if len(row) > self.width:
+            self.width = len(row)
+
+        # Total orders = last row with anything in columns A-E
+        for value in row[:ORDER_COUNT_COLUMNS]:
+            if value is not None and str(value).strip() != '':
+                self.last_order_idx = idx
+                break
+
+        if self.compensation_idx is not None and self.compensation_idx < len(row):
+            value = row[self.compensation_idx]
+            if value is not None:
+                try:
+                    if float(value) != 0:
+                        self.compensation_orders += 1
+                except (ValueError, TypeError):
+                    pass
+
+
+    @property
+    def total_orders(self):
+        # Same as counting D1W rows 6..last non-empty row (an empty sheet counts as 1)
+        return max(self.last_order_idx + 1, 1)
+
+    def column_sums(self):
+        """(cancelled, delivered, skipped_rows) for every column from 'Subtotal (items total)' on"""
+        if self._sums is None:
+            self._sums = sum_by_order_status(self.rows, self.status_idx, self.item_total_idx, self.width)
+        return self._sums
+
+    @property
+    def commissionable_value(self):
+        """Row 4 (delivered + cancelled) of the commissionable value column, if calculated"""
+        if not self.has_calculations or self.commissionable_idx is None:
+            return None
+        i = self.commissionable_idx - self.item_total_idx
+        if i < 0:
+            return None
+        cancelled, delivered, _ = self.column_sums()
+        return delivered[i] + cancelled[i]
+
+
+def read_order_level(src, start_row, target_month=None, week_info=None, columns=None):
+    """
+    Stream an invoice's Order Level sheet once: keep target-month rows and
+    sum the order level payout of opening/closing spillover rows.
+    columns: header specs to keep (see invoice_reader), None = every column.
+    Returns (OrderLevelTotals, spillover_result); spillover_result is None
+    when the sheet cannot be filtered by month and every row is kept.
+    """
+    reader = SheetReader(src, start_row, columns, leading=ORDER_COUNT_COLUMNS, reads=ORDER_FILTER_COLUMNS)
 
     order_date_col = None
     payout_col = None
 
-    for col_num in range(1, src.max_column + 1):
-        header = str(src.cell(row=start_row, column=col_num).value or "").strip().lower()
-        if header == "order date":
+    for col_num, value in enumerate(reader.source_header, 1):
+        header_text = str(value or "").strip().lower()
+        if header_text == "order date":
             order_date_col = col_num
-        if "payout" in header and "date" not in header:
+        if "payout" in header_text and "date" not in header_text:
             payout_col = col_num
 
+    totals = OrderLevelTotals(reader.header)
+    if not reader.projection.is_raw:
+        print(f"  🔎 Reading {len(reader.header)} of {len(reader.source_header)} columns")
+
     if not order_date_col or not target_month:
         print(f"  ⚠️  Order Date or Target Month missing - copying all data")
-        max_row, max_col = src.max_row, src.max_column
-        tgt.delete_rows(1, tgt.max_row)
-        for r in range(start_row, max_row + 1):
-            for c in range(1, max_col + 1):
-                tgt.cell(row=r - start_row + 1, column=c).value = src.cell(row=r, column=c).value
-        print(f"  📊 Copied {max_row - start_row + 1} rows")
-        return None
+        for row_values in reader.rows():
+            totals.add(row_values)
+        print(f"  📊 Copied {len(totals.rows) + 1} rows")
+        return totals, None
 
     print(f"  ✅ Order Date column: {order_date_col}")
     if payout_col:
         print(f"  ✅ Order level Payout column: {payout_col}")
 
     target_month_num = month_str_to_num(target_month[:3])
+    target_year = week_info['start_date'].year if week_info else datetime.now().year
 
-    opening_spillover_sum = 0
-    closing_spillover_sum = 0
-
-    tgt.delete_rows(1, tgt.max_row)
-    for c in range(1, src.max_column + 1):
-        tgt.cell(row=1, column=c).value = src.cell(row=start_row, column=c).value
+    spillover = {'opening': 0, 'closing': 0, 'opening_rows': 0, 'closing_rows': 0}
 
-    tgt_row = 2
-    copied_rows = 0
-    opening_rows = 0
-    closing_rows = 0
-    max_col = src.max_column
-    data_start_row = start_row + 1
+    print(f"  🔄 Scanning data rows from {start_row + 1}...")
 
-    print(f"  🔄 Scanning data rows {data_start_row} to {src.max_row}...")
+    parse_date = DateColumnParser()
 
-    for row_values in src.iter_rows(min_row=data_start_row, values_only=True):
+    def order_date(row_values):
         try:
             date_value = row_values[order_date_col - 1]
-            if not date_value or date_value == '#REF!': continue
-            row_date = parse(date_value)
-            row_month_num = row_date.month
-            row_year = row_date.year
-        except:
-            continue
+        except IndexError:
+            return None
+        if not date_value or date_value == '#REF!': return None
+        return parse_date.get(date_value)
 
-        if not row_month_num:
-            continue
+    def in_target_month(row_values):
+        row_date = order_date(row_values)
+        return row_date is not None and row_date.month == target_month_num and row_date.year == target_year
+
+    def add_spillover(row_values):
+        # Rows outside the target month only count towards the spillover payout
+        row_date = order_date(row_values)
+        if row_date is None:
+            return
+        row_month_num = row_date.month
+        row_year = row_date.year
 
         payout_value = 0
         if payout_col:
@@ -523,139 +786,80 @@ def copy_data_with_spillover_filter(src, tgt, start_row, target_month=None, week
                 payout_value = row_values[payout_col - 1]
             except IndexError:
                 payout_value = 0
-                
+
             if not isinstance(payout_value, (int, float)):
                 payout_value = 0
 
         # Determine correct spillover type (handling Dec->Jan transition)
-        is_opening = False
-        is_closing = False
-
-        target_year = week_info['start_date'].year if week_info else datetime.now().year
-
-        if row_month_num == target_month_num and row_year == target_year:
-            pass # Current month
-        elif (row_year < target_year) or (row_year == target_year and row_month_num < target_month_num):
-            is_opening = True
-        elif (row_year > target_year) or (row_year == target_year and row_month_num > target_month_num):
-            is_closing = True
-
-        if is_opening:
-            opening_spillover_sum += payout_value
-            opening_rows += 1
-        elif is_closing:
-            closing_spillover_sum += payout_value
-            closing_rows += 1
+        if (row_year < target_year) or (row_year == target_year and row_month_num < target_month_num):
+            spillover['opening'] += payout_value
+            spillover['opening_rows'] += 1
         else:
-            for col_idx, val in enumerate(row_values, 1):
-                tgt.cell(row=tgt_row, column=col_idx).value = val
-            tgt_row += 1
-            copied_rows += 1
-
-    print(f"  📊 Copied {copied_rows} data rows (target month: {target_month})")
-    print(f"  📊 Opening spillover: {opening_rows} rows → Sum: {opening_spillover_sum}")
-    print(f"  📊 Closing spillover: {closing_rows} rows → Sum: {closing_spillover_sum}")
-
-    return {
-        'opening_spillover': opening_spillover_sum,
-        'closing_spillover': closing_spillover_sum,
-        'week_num': week_info['week_num'] if week_info else None
-    }
-
-
-def count_total_orders_from_d1w(d1_sheet, header_row=5):
-    """
-    Count ALL orders - simply count all rows below header
-    """
-    try:
-        data_start_row = header_row + 1  # Row 6 onwards
-
-        # Find the ACTUAL last row with data
-        last_data_row = data_start_row
-
-        max_r, _ = get_safe_dimensions(d1_sheet)
-        for row_num in range(data_start_row, max_r + 1):
-            # Check first 5 columns for any data
-            has_data = False
-            for col in range(1, 6):  # Check columns A-E
-                cell_value = d1_sheet.cell(row=row_num, column=col).value
-                if cell_value is not None and str(cell_value).strip() != '':
-                    has_data = True
-                    last_data_row = row_num
-                    break
-
-        # Count from data_start to last_data_row
-        count = last_data_row - data_start_row + 1
+            spillover['closing'] += payout_value
+            spillover['closing_rows'] += 1
 
-        # Sanity check - if count is negative or zero, return 0
-        if count <= 0:
-            print(f"  ⚠️  No data rows found after header row {header_row}")
-            return 0
+    for row_values in reader.rows(where=in_target_month, on_skip=add_spillover):
+        totals.add(row_values)  # Current month
 
-        print(f"  📊 Total Orders: {count} (rows {data_start_row} to {last_data_row})")
-        return count
+    print(f"  📊 Copied {len(totals.rows)} data rows (target month: {target_month})")
+    print(f"  📊 Opening spillover: {spillover['opening_rows']} rows → Sum: {spillover['opening']}")
+    print(f"  📊 Closing spillover: {spillover['closing_rows']} rows → Sum: {spillover['closing']}")
 
-    except Exception as e:
-        print(f"  ❌ Error counting orders: {e}")
-        import traceback
-        traceback.print_exc()
-        return 0
+    return totals, {
+        'opening_spillover': spillover['opening'],
+        'closing_spillover': spillover['closing'],
+        'week_num': week_info['week_num'] if week_info else None
+    }
 
 
-def count_nonzero_compensation(sheet, data_row=1):
-    """
-    Count non-zero values in 'Customer Compensation/Recoupment' column
-    data_row should be the row with calculated values (row 1 after 4 rows inserted)
-    """
-    try:
-        # Find Customer Compensation/Recoupment column in HEADER ROW (row 5)
-        compensation_col = None
-        header_row = 5  # Header is always at row 5 after inserting 4 rows
+def write_order_level_to_d1w(data1_sheet, totals):
+    """Write the kept rows to D1W below the 4 reserved aggregate rows"""
+    # Header straight onto row 5 (no insert_rows shifting every cell afterwards)
+    for col_num, value in enumerate(totals.header, 1):
+        data1_sheet.cell(row=D1W_HEADER_ROW, column=col_num).value = value
+    for row in totals.rows:
+        data1_sheet.append(row)
 
-        print(f"  🔍 Searching for compensation column in row {header_row}...")
+    if totals.item_total_idx is None:
+        print("❌ 'Subtotal (items total)' NOT FOUND!")
+        return
+    if totals.status_idx is None:
+        print("❌ 'Order status (Delivered/ Cancelled/ Rejected)' NOT FOUND!")
+        return
 
-        max_r, max_c = get_safe_dimensions(sheet)
-        for col_num in range(1, max_c + 1):
-            header = str(sheet.cell(row=header_row, column=col_num).value or "").strip().lower()
+    item_total_col = totals.item_total_idx + 1
+    print(f"📊 Summing from col {item_total_col}")
 
-            if "customer compensation" in header and "recoupment" in header:
-                compensation_col = col_num
-                print(f"  ✅ Found compensation column: Col {col_num} - '{header}'")
-                break
+    cancelled, delivered, skipped_rows = totals.column_sums()
+    for i, col in enumerate(range(item_total_col, totals.width + 1)):
+        data1_sheet.cell(row=1, column=col).value = cancelled[i]
+        data1_sheet.cell(row=2, column=col).value = delivered[i]
+        data1_sheet.cell(row=3, column=col).value = delivered[i] * 1.18
+        data1_sheet.cell(row=4, column=col).value = delivered[i] + cancelled[i]
 
-        if not compensation_col:
-            print(f"  ❌ Compensation column not found")
-            return 0
+    if skipped_rows > 0:
+        print(f"⚠️  Skipped {skipped_rows} rows (REJECTED or unknown status)")
 
-        # Get the SUM value from the calculated row (row 1, 2, or 4)
-        # Row 1 = Cancelled, Row 2 = Delivered, Row 4 = Total
-        # We want to count from DATA ROWS (row 6 onwards), not from calculated rows!
+    print("✅ EXACT MATCH - CANCELLED/DELIVERED calculations COMPLETE!")
 
-        count = 0
-        data_start_row = header_row + 1  # Row 6 onwards
 
-        print(f"  🔄 Counting non-zero compensation from row {data_start_row} to {max_r}...")
+def map_order_totals_to_summary(summary_sheet, totals, week_num):
+    """Map total orders, compensation orders and commissionable value to Summary"""
+    summary_col = 3 + (week_num - 1)
 
-        for row in range(data_start_row, max_r + 1):
-            value = sheet.cell(row=row, column=compensation_col).value
+    summary_sheet.cell(row=6, column=summary_col).value = totals.total_orders
+    print(f"  ✅ Mapped Total Orders to Summary[row=6, col={summary_col}]: {totals.total_orders}")
 
-            # Check if value is non-zero
-            if value is not None:
-                try:
-                    num_value = float(value)
-                    if num_value != 0:
-                        count += 1
-                except (ValueError, TypeError):
-                    pass
+    summary_sheet.cell(row=12, column=summary_col).value = totals.compensation_orders
+    print(f"  ✅ Mapped Compensation Orders to Summary[row=12, col={summary_col}]: {totals.compensation_orders}")
 
-        print(f"  📊 Non-zero compensation count: {count}")
-        return count
-
-    except Exception as e:
-        print(f"  ❌ Error counting compensation: {e}")
-        import traceback
-        traceback.print_exc()
-        return 0
+    commissionable_value = totals.commissionable_value
+    if commissionable_value is None:
+        print(f"  ⚠️  Commissionable value not available")
+        return False
+    summary_sheet.cell(row=19, column=summary_col).value = commissionable_value
+    print(f"  ✅ Mapped commissionable value to Summary[row=19, col={summary_col}]: {commissionable_value}")
+    return True
 
 
 ZOMATO_MAPPING = {
@@ -694,74 +898,28 @@ ZOMATO_MAPPING = {
 }
 
 
-def perform_calculations_on_data1(wb, data1_sheet, week, recon_path):
-    """Add 4 rows + calculate with EXACT column matching"""
-    data1_sheet.insert_rows(1, 4)
-    print("✅ Inserted 4 rows at top")
-
-    header_row = 5
-    item_total_col = None
-    order_status_col = None
-
-    print(f"🔍 Scanning headers in row {header_row}...")
-    max_r, max_c = get_safe_dimensions(data1_sheet)
-    for col_num in range(1, max_c + 1):
-        header = str(data1_sheet.cell(row=header_row, column=col_num).value or "")
-        header_lower = header.lower()
-
-        if header_lower == "order status (delivered/ cancelled/ rejected)":
-            order_status_col = col_num
-            print(f"✅ EXACT ORDER STATUS at col {order_status_col}: '{header}'")
-
-        if header_lower == "subtotal (items total)":
-            item_total_col = col_num
-            print(f"✅ EXACT SUBTOTAL at col {item_total_col}: '{header}'")
-
-    if not item_total_col:
-        print("❌ 'Subtotal (items total)' NOT FOUND!")
-        return
-
-    if not order_status_col:
-        print("❌ 'Order status (Delivered/ Cancelled/ Rejected)' NOT FOUND!")
-        return
-
-    print(f"📊 Summing from col {item_total_col}")
-
-    delivered = [0] * (data1_sheet.max_column - item_total_col + 1)
-    cancelled = [0] * (data1_sheet.max_column - item_total_col + 1)
-
-    data_start_row = header_row + 1
-    skipped_rows = 0
-
-    max_r, max_c = get_safe_dimensions(data1_sheet)
-    for row in range(data_start_row, max_r + 1):
-        status_text = str(data1_sheet.cell(row=row, column=order_status_col).value or "").upper().strip()
-
-        if status_text == "DELIVERED":
-            status = "delivered"
-        elif status_text in ["CANCELLED", "TIMEDOUT", "TIMEOUT", "REJECTED"]:
-            status = "cancelled"
-        else:
-            skipped_rows += 1
-            continue
-
-        target = delivered if status == "delivered" else cancelled
-
-        for i, col in enumerate(range(item_total_col, data1_sheet.max_column + 1)):
-            val = data1_sheet.cell(row=row, column=col).value
-            if isinstance(val, (int, float)) and val != 0:
-                target[i] += val
-
-    for i, col in enumerate(range(item_total_col, max_c + 1)):
-        data1_sheet.cell(row=1, column=col).value = cancelled[i]
-        data1_sheet.cell(row=2, column=col).value = delivered[i]
-        data1_sheet.cell(row=3, column=col).value = delivered[i] * 1.18
-        data1_sheet.cell(row=4, column=col).value = delivered[i] + cancelled[i]
-
-    if skipped_rows > 0:
-        print(f"⚠️  Skipped {skipped_rows} rows (REJECTED or unknown status)")
-
-    print("✅ EXACT MATCH - CANCELLED/DELIVERED calculations COMPLETE!")
+LONG_DISTANCE_DISCOUNT_HEADERS = [
+    "Discount on long distance enablement fee",
+    "Discount on Fulfilment fee"
+]
+
+# Order Level columns the month / week filters read: order date and order level payout
+ORDER_FILTER_COLUMNS = ["order date", lambda text: "payout" in text and "date" not in text]
+
+# Every Order Level column the D1W totals, Cashflow and Summary mappings read,
+# for D1W sheets that skip the full dump (the first ORDER_COUNT_COLUMNS are kept too)
+ZOMATO_D1W_COLUMNS = (
+    [name for headers, _, _ in ZOMATO_MAPPING.values() for name in headers]
+    + LONG_DISTANCE_DISCOUNT_HEADERS
+    + ORDER_FILTER_COLUMNS
+    + [
+        ORDER_STATUS_HEADER,
+        SUBTOTAL_HEADER,
+        header_contains("customer compensation", "recoupment"),
+        header_contains("commissionable value"),
+        header_contains("extra inventory ads (order level deduction)"),
+    ]
+)
 
 
 def map_values_to_cashflow(wb, data1_sheet, week, week_type="normal"):
@@ -832,10 +990,7 @@ def map_values_to_cashflow(wb, data1_sheet, week, week_type="normal"):
 
         if label == "Long Distance Fee":
             fee_cols = all_matching_cols
-            discount_cols = find_all_columns([
-                "Discount on long distance enablement fee",
-                "Discount on Fulfilment fee"
-            ])
+            discount_cols = find_all_columns(LONG_DISTANCE_DISCOUNT_HEADERS)
 
             if fee_cols:
                 fee_cell = data1_sheet.cell(row=data_row, column=fee_cols[0]).coordinate
@@ -966,57 +1121,6 @@ def map_d2w_values_to_cashflow(wb, d2_sheet, week, week_type="normal"):
             print(f"  ❌ '{cashflow_label}' - No data found in D2W or D1W")
 
 
-def map_commissionable_value_to_summary(summary_sheet, d1_sheet, week_num):
-    """Map commissionable value to Summary sheet"""
-    try:
-        print(f"\n  🔍 Looking for Commissionable value column in D1W...")
-
-        commissionable_col = None
-        header_row = 5
-
-        # ✅ Multiple possible header variations
-        possible_headers = [
-            "commissionable value (excludes customer gst)",
-            "commissionable value (excludes customer gst)\n[(a) + (7) - (8) - (6) - (3)]",
-            "commissionable value",
-            "commissionable value\n(excludes customer gst)"
-        ]
-
-        _, max_c = get_safe_dimensions(d1_sheet)
-        for col_num in range(1, max_c + 1):
-            header = str(d1_sheet.cell(row=header_row, column=col_num).value or "").strip().lower()
-
-            if "commissionable value" in header:
-                commissionable_col = col_num
-                print(f"  ✅ Found Commissionable value column: Col {col_num}")
-                break
-
-        if not commissionable_col:
-            print(f"  ❌ Commissionable value column not found")
-            return False
-
-        commissionable_value = d1_sheet.cell(row=4, column=commissionable_col).value
-
-        if commissionable_value is None:
-            print(f"  ⚠️  No value in row 4, col {commissionable_col}")
-            return False
-
-        print(f"  📊 Commissionable value (row 4): {commissionable_value}")
-
-        summary_col = 3 + (week_num - 1)
-
-        summary_sheet.cell(row=19, column=summary_col).value = commissionable_value
-        print(f"  ✅ Mapped to Summary[row=19, col={summary_col}]: {commissionable_value}")
-
-        return True
-
-    except Exception as e:
-        print(f"  ❌ Error mapping commissionable value: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-
 def replace_month_in_sheets(wb, user_month):
     """Replace 'July' placeholder with actual month name"""
     sheets_to_update = ['Summary', 'Cashflow', 'Profit statement', 'Discrepancies']
@@ -1092,6 +1196,87 @@ def copy_logos_between_workbooks(template_path, target_wb, sheet_names_to_copy=N
         return False
 
 
+ORDER_SHEET_NAMES = [
+    "Order Level", "Order level", "Order level Breakup",
+    "Order Details", "Order Summary", "Orders"
+]
+D2W_SHEET_NAMES = [
+    "Additions and Deductions",
+    "Addition Deductions Details",
+    "Additional and Deductions",
+    "Deductions"
+]
+PARALLEL_PARSE_MIN_BYTES = 2 * 1024 * 1024  # Smaller batches parse faster than worker processes start
+
+
+def parse_zomato_invoice(fp, month, week_info, full_dump=True, reader_backend="openpyxl"):
+    """
+    Read everything the recon needs from one weekly invoice.
+    Safe to run in a worker process: it only reads, and returns a compact dict
+    (Order Level totals, spillover sums, D2W rows) for the single writer.
+    full_dump=False keeps only the ZOMATO_D1W_COLUMNS of the Order Level sheet.
+    reader_backend: "openpyxl" or "xml" (see invoice_reader.READER_BACKENDS).
+    """
+    print(f"\n--- Processing {fp.name} → Week {week_info['week_num']} ---")
+    wb_invoice = open_invoice_workbook(fp, reader_backend)
+
+    try:
+        parsed = {'order_totals': None, 'spillover': None, 'd2_rows': None}
+
+        for sheet_name in ORDER_SHEET_NAMES:
+            if sheet_name in wb_invoice.sheetnames:
+                print(f"✅ ORDER SHEET: '{sheet_name}'")
+                parsed['order_totals'], parsed['spillover'] = read_order_level(
+                    wb_invoice[sheet_name], 7, month, week_info,
+                    columns=None if full_dump else ZOMATO_D1W_COLUMNS
+                )
+                break
+
+        print(f"\n🔍 Looking for D2W sheet...")
+        print(f"  Available sheets in invoice: {wb_invoice.sheetnames}")
+
+        for sheet_name in D2W_SHEET_NAMES:
+            if sheet_name in wb_invoice.sheetnames:
+                d2_source = wb_invoice[sheet_name]
+                print(f"✅ D2W SHEET FOUND: '{sheet_name}'")
+                print(f"  📏 Source dimensions: {d2_source.max_row} rows × {d2_source.max_column} cols")
+                parsed['d2_rows'] = list(d2_source.iter_rows(values_only=True))
+                break
+
+        return parsed
+
+    finally:
+        wb_invoice.close()
+        del wb_invoice
+        gc.collect()
+        print(f"  🧹 Closed invoice workbook")
+
+
+def iter_parsed_invoices(weeks, month, parse_workers=None, full_dump=True, reader_backend="openpyxl"):
+    """
+    Yield parse_zomato_invoice() results in week order.
+    Invoices are parsed in worker processes when there are several large ones.
+    parse_workers caps those processes; None means one per core, or none when
+    this already runs in a worker process (the app's engine pool).
+    """
+    if parse_workers is None:
+        parse_workers = 1 if multiprocessing.parent_process() is not None else (os.cpu_count() or 1)
+    if sum(os.path.getsize(w['invoice_fp']) for w in weeks) < PARALLEL_PARSE_MIN_BYTES:
+        parse_workers = 1
+    parse_workers = min(parse_workers, len(weeks))
+
+    if parse_workers <= 1:
+        for w in weeks:
+            yield parse_zomato_invoice(w['invoice_fp'], month, w, full_dump, reader_backend)
+        return
+
+    print(f"⚙️  Parsing {len(weeks)} invoices with {parse_workers} worker processes")
+    with ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(parse_zomato_invoice, w['invoice_fp'], month, w, full_dump, reader_backend) for w in weeks]
+        for future in futures:
+            yield future.result()
+
+
 def process_zomato_recon(
         invoice_folder_path,
         template_recon_path,
@@ -1103,7 +1288,10 @@ def process_zomato_recon(
         last_week_start=None,  # ADD
         last_week_end=None,  # ADD
         bank_file_path=None,
-        progress_callback=None  # ADD
+        progress_callback=None,  # ADD
+        parse_workers=None,  # Most invoice parsing processes (None = auto, see iter_parsed_invoices)
+        full_dump=True,  # False: D1W sheets get only the columns the recon reads
+        reader_backend="openpyxl"  # Invoice reader: "openpyxl" or "xml"
 ):
     """Zomato reconciliation engine"""
     try:
@@ -1217,6 +1405,11 @@ def process_zomato_recon(
 
         total_weeks = len(week_plan)
 
+        # ✅ Parse invoices (in parallel for large batches); this thread is the only writer
+        parsed_invoices = iter_parsed_invoices(
+            [w for w in week_plan if w['invoice_fp'] is not None], month, parse_workers, full_dump, reader_backend
+        )
+
         for idx, week_info in enumerate(week_plan):
             # Update progress
             if progress_callback:
@@ -1231,120 +1424,58 @@ def process_zomato_recon(
                 print(f"\n--- Week {week_num}: {week_info['week_label']} - SKIPPED (no invoice) ---")
                 continue
 
-            print(f"\n--- Processing {fp.name} → Week {week_num} ---")
-
-            wb_invoice = openpyxl.load_workbook(fp, data_only=True, read_only=True)
-
-            try:
-                possible_order_sheets = [
-                    "Order Level", "Order level", "Order level Breakup",
-                    "Order Details", "Order Summary", "Orders"
-                ]
-                ol_sheet = None
-                for sheet_name in possible_order_sheets:
-                    if sheet_name in wb_invoice.sheetnames:
-                        ol_sheet = wb_invoice[sheet_name]
-                        print(f"✅ ORDER SHEET: '{sheet_name}'")
-                        break
-
-                if ol_sheet:
-                    d1 = ensure_sheet(recon, f"D1W{week_num}")
+            print(f"\n--- Writing {fp.name} → Week {week_num} ---")
+            parsed = next(parsed_invoices)
 
-                    spillover_result = copy_data_with_spillover_filter(ol_sheet, d1, 7, month, week_info, None)
+            order_totals = parsed['order_totals']
+            if order_totals is not None:
+                d1 = ensure_sheet(recon, f"D1W{week_num}")
+                spillover_result = parsed['spillover']
 
-                    if spillover_result:
-                        if spillover_result['opening_spillover'] != 0:
-                            opening_spillover_value = spillover_result['opening_spillover']
-                            print(f"  📝 Captured opening spillover: {opening_spillover_value}")
+                if spillover_result:
+                    if spillover_result['opening_spillover'] != 0:
+                        opening_spillover_value = spillover_result['opening_spillover']
+                        print(f"  📝 Captured opening spillover: {opening_spillover_value}")
 
-                        if spillover_result['closing_spillover'] != 0:
-                            closing_spillover_value = spillover_result['closing_spillover']
-                            closing_week_num = week_num
-                            print(f"  📝 Captured closing spillover: {closing_spillover_value} (Week {week_num})")
+                    if spillover_result['closing_spillover'] != 0:
+                        closing_spillover_value = spillover_result['closing_spillover']
+                        closing_week_num = week_num
+                        print(f"  📝 Captured closing spillover: {closing_spillover_value} (Week {week_num})")
 
-                    perform_calculations_on_data1(recon, d1, week_num, output_path)
-                    map_values_to_cashflow(recon, d1, week_num)
+                write_order_level_to_d1w(d1, order_totals)
+                map_values_to_cashflow(recon, d1, week_num)
+                map_order_totals_to_summary(summary_sheet, order_totals, week_num)
 
-                    total_orders = count_total_orders_from_d1w(d1, header_row=5)
-                    summary_col = 3 + (week_num - 1)
-                    summary_sheet.cell(row=6, column=summary_col).value = total_orders
-                    print(f"  ✅ Mapped Total Orders to Summary[row=6, col={summary_col}]: {total_orders}")
-
-                    comp_orders = count_nonzero_compensation(d1, data_row=5)
-                    summary_sheet.cell(row=12, column=summary_col).value = comp_orders
-                    print(f"  ✅ Mapped Compensation Orders to Summary[row=12, col={summary_col}]: {comp_orders}")
-
-                    map_commissionable_value_to_summary(summary_sheet, d1, week_num)
-
-                else:
-                    print(f"⚠️  No Order Level sheet found")
-
-                # ✅ COPY D2W (Additions/Deductions)
-                print(f"\n🔍 Looking for D2W sheet in {fp.name}...")
-                print(f"  Available sheets: {wb_invoice.sheetnames}")
-
-                # ✅ COPY D2W (Additions/Deductions)
-                print(f"\n🔍 Looking for D2W sheet...")
-                print(f"  Available sheets in invoice: {wb_invoice.sheetnames}")
-
-                possible_d2_sheets = [
-                    "Additions and Deductions",
-                    "Addition Deductions Details",
-                    "Additional and Deductions",
-                    "Deductions"
-                ]
-
-                d2_source = None
-                found_sheet_name = None
-                for sheet_name in possible_d2_sheets:
-                    if sheet_name in wb_invoice.sheetnames:
-                        d2_source = wb_invoice[sheet_name]
-                        found_sheet_name = sheet_name
-                        print(f"✅ D2W SHEET FOUND: '{sheet_name}'")
-                        break
-
-                if d2_source:
-                    d2 = ensure_sheet(recon, f"D2W{week_num}")
-                    print(f"  📋 Target sheet: D2W{week_num}")
-
-                    # Get dimensions
-                    max_row = d2_source.max_row
-                    max_col = d2_source.max_column
-                    print(f"  📏 Source dimensions: {max_row} rows × {max_col} cols")
-
-                    # Clear target sheet
-                    if d2.max_row > 1:
-                        d2.delete_rows(1, d2.max_row)
-                        print(f"  🗑️  Cleared existing D2W{week_num} data")
+            else:
+                print(f"⚠️  No Order Level sheet found")
+
+            # ✅ COPY D2W (Additions/Deductions)
+            d2_rows = parsed['d2_rows']
+            if d2_rows is not None:
+                d2 = ensure_sheet(recon, f"D2W{week_num}")
+                print(f"  📋 Target sheet: D2W{week_num}")
+
+                # Clear target sheet
+                if d2.max_row > 1:
+                    d2.delete_rows(1, d2.max_row)
+                    print(f"  🗑️  Cleared existing D2W{week_num} data")
+
+                # Copy ALL data from D2W source
+                copied_cells = 0
+                for row_idx, row_values in enumerate(d2_rows, 1):
+                    for col_idx, value in enumerate(row_values, 1):
+                        if value is not None:
+                            d2.cell(row=row_idx, column=col_idx).value = value
+                            copied_cells += 1
+
+                print(f"  ✅ Copied {copied_cells} cells to D2W{week_num}")
+            else:
+                print(f"  ⚠️  No D2W source sheet found for Week {week_num}, creating empty D2W{week_num} for mapping")
+                d2 = ensure_sheet(recon, f"D2W{week_num}")
 
-                    # Copy ALL data from D2W source
-                    copied_cells = 0
-                    
-                    # Optimization: Use iter_rows for faster reading
-                    for row_idx, row_values in enumerate(d2_source.iter_rows(values_only=True), 1):
-                        for col_idx, value in enumerate(row_values, 1):
-                            if value is not None:
-                                d2.cell(row=row_idx, column=col_idx).value = value
-                                copied_cells += 1
-
-                    print(f"  ✅ Copied {copied_cells} cells to D2W{week_num}")
-
-                    # ✅ VERIFY THE COPY
-                    verify_row_1 = [d2.cell(row=1, column=c).value for c in range(1, min(5, max_col + 1))]
-                    print(f"  🔍 Verification - First 4 cells of row 1: {verify_row_1}")
-                else:
-                    print(f"  ⚠️  No D2W source sheet found for Week {week_num}, creating empty D2W{week_num} for mapping")
-                    d2 = ensure_sheet(recon, f"D2W{week_num}")
-
-                # Map D2W values to Cashflow (always call this to check D1W as well)
-                print(f"  🔗 Mapping week-wise deductions (D2W/D1W) to Cashflow...")
-                map_d2w_values_to_cashflow(recon, d2, week_num)
-
-            finally:
-                wb_invoice.close()
-                del wb_invoice
-                gc.collect()
-                print(f"  🧹 Closed invoice workbook")
+            # Map D2W values to Cashflow (always call this to check D1W as well)
+            print(f"  🔗 Mapping week-wise deductions (D2W/D1W) to Cashflow...")
+            map_d2w_values_to_cashflow(recon, d2, week_num)
 
         # ✅ SAVE WORKBOOK AFTER PROCESSING ALL WEEKS
         print(f"\n💾 Saving reconciliation workbook...")
@@ -0,0 +1,92 @@
+"""
+In-memory progress registry for reconciliation tasks.
+Engines report progress through callbacks; the web routes read it back.
+Nothing touches the filesystem, so an update or a poll is a dict lookup.
+"""
+
+import threading
+import time
+
+
+class ProgressStore:
+    """
+    Thread-safe task_id -> progress map.
+
+    - Monotonic: a task's progress never moves backwards and is capped at 100.
+    - Coalescing: repeated or stale values are dropped, so callers only ever
+      see (and wait on) real changes.
+    - TTL: tasks not updated for `ttl` seconds are evicted lazily.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._tasks = {}
+        self._cond = threading.Condition()
+
+    def update(self, task_id, progress, stage=None, result=None):
+        """
+        Record progress for task_id; returns True if the stored value changed.
+        stage is a short status name ('queued', 'running', 'done'...) and
+        result the final payload (download_url, message...) of the task.
+        """
+        if not task_id:
+            return False
+        try:
+            progress = min(max(int(progress), 0), 100)
+        except (TypeError, ValueError):
+            return False
+
+        with self._cond:
+            now = time.time()
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                self._evict_expired(now)
+                entry = {'progress': 0, 'stage': None, 'result': None, 'version': 0, 'updated_at': now}
+                self._tasks[task_id] = entry
+
+            changed = (progress > entry['progress']
+                       or (stage is not None and stage != entry['stage'])
+                       or (result is not None and result != entry['result']))
+            if not changed:
+                return False
+
+            entry['progress'] = max(progress, entry['progress'])
+            if stage is not None:
+                entry['stage'] = stage
+            if result is not None:
+                entry['result'] = result
+            entry['version'] += 1
+            entry['updated_at'] = now
+            self._cond.notify_all()
+        return True
+
+    def get(self, task_id):
+        """Snapshot of a task's progress, or None if unknown/expired"""
+        with self._cond:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return None
+            if time.time() - entry['updated_at'] > self.ttl:
+                del self._tasks[task_id]
+                return None
+            return dict(entry)
+
+    def wait_for_change(self, task_id, version, timeout=None):
+        """Block until task_id moves past `version` (or timeout); returns the latest snapshot"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._tasks.get(task_id, {}).get('version', 0) > version,
+                timeout=timeout
+            )
+            entry = self._tasks.get(task_id)
+            return dict(entry) if entry else None
+
+    def discard(self, task_id):
+        with self._cond:
+            self._tasks.pop(task_id, None)
+
+    def _evict_expired(self, now):
+        expired = [task_id for task_id, entry in self._tasks.items()
+                   if now - entry['updated_at'] > self.ttl]
+        for task_id in expired:
+            del self._tasks[task_id]
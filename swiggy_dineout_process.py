@@ -7,6 +7,8 @@ import pandas as pd
 from werkzeug.utils import secure_filename
 import gc
 
+from upload_buffer import UploadSpool, iter_read_uploads
+
 def parse_date_range(date_str):
     """
     Parses a date range string like "01 October - 05 October" or "28 Sep - 05 Oct".
@@ -256,55 +258,63 @@ def consolidate_swiggy_dineout(out_wb, sd_data_map, client_name="", month_name="
         except Exception as e:
             print(f"⚠️ Error mapping {sd_key}: {e}")
 
-def process_swiggy_dineout(invoice_files, template_path, output_dir, update_progress=None, client_name="", month="", forced_filename=None):
+def read_dineout_invoice(filename, source):
+    """
+    Period (Summary!B18) and payout data block of one invoice, or None if it
+    cannot be read. Only reads, so it can run in a worker process.
+    """
+    try:
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        start_date, end_date = datetime.max, datetime.max
+        
+        if 'Summary' in wb.sheetnames:
+            ws_sum = wb['Summary']
+            date_val = ws_sum['B18'].value 
+            if date_val:
+                s, e, _ = parse_date_range(date_val)
+                if s: start_date, end_date = s, e
+        
+        target_sheet = None
+        for sname in wb.sheetnames:
+            if "payout" in sname.lower() and "invoice" in sname.lower():
+                target_sheet = wb[sname]
+                break
+        if not target_sheet: target_sheet = wb.active
+        
+        data_content = extract_data_block_fast(target_sheet)
+        wb.close()
+        del wb
+        return {
+            'start': start_date,
+            'end': end_date,
+            'data': data_content,
+            'filename': filename
+        }
+    except Exception as e:
+        print(f"❌ Error processing {filename}: {e}")
+        return None
+
+def process_swiggy_dineout(invoice_files, template_path, output_dir, update_progress=None, client_name="", month="", forced_filename=None,
+                           read_workers=None):
     """
     Final optimized processing logic.
+    read_workers: most processes reading the uploads (None = auto, see iter_read_uploads)
     """
-    temp_files = []
     processed_items = []
     
     try:
         if update_progress: update_progress(10)
 
-        for idx, file in enumerate(invoice_files):
-            filename = secure_filename(file.filename)
-            temp_path = os.path.join(output_dir, f"temp_{filename}")
-            file.save(temp_path)
-            temp_files.append(temp_path)
-            
-            try:
-                wb = openpyxl.load_workbook(temp_path, read_only=True, data_only=True)
-                start_date, end_date = datetime.max, datetime.max
-                
-                if 'Summary' in wb.sheetnames:
-                    ws_sum = wb['Summary']
-                    date_val = ws_sum['B18'].value 
-                    if date_val:
-                        s, e, _ = parse_date_range(date_val)
-                        if s: start_date, end_date = s, e
-                
-                target_sheet = None
-                for sname in wb.sheetnames:
-                    if "payout" in sname.lower() and "invoice" in sname.lower():
-                        target_sheet = wb[sname]
-                        break
-                if not target_sheet: target_sheet = wb.active
-                
-                data_content = extract_data_block_fast(target_sheet)
-                processed_items.append({
-                    'start': start_date,
-                    'end': end_date,
-                    'data': data_content,
-                    'filename': filename
-                })
-                wb.close()
-                del wb
-            except Exception as e:
-                print(f"❌ Error processing {filename}: {e}")
-            
-            if update_progress: 
-                p = 10 + int((idx+1)/len(invoice_files)*40)
-                update_progress(p)
+        # Uploads are read from memory (or a private spool), never saved next to the downloads.
+        # Results come back in upload order, so the stable sort below sees the same list either way.
+        uploads = [(secure_filename(file.filename), file) for file in invoice_files]
+        with UploadSpool() as spool:
+            for idx, item in enumerate(iter_read_uploads(read_dineout_invoice, uploads, spool, read_workers)):
+                if item:
+                    processed_items.append(item)
+                if update_progress: 
+                    p = 10 + int((idx+1)/len(invoice_files)*40)
+                    update_progress(p)
 
         processed_items.sort(key=lambda x: x['start'])
         if update_progress: update_progress(60)
@@ -361,10 +371,6 @@ def process_swiggy_dineout(invoice_files, template_path, output_dir, update_prog
         out_wb.save(full_path)
         out_wb.close()
         
-        for f in temp_files:
-            try: os.remove(f)
-            except: pass
-        
         gc.collect()
         return output_filename, None
     except Exception as e:
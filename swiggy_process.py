@@ -1,4 +1,6 @@
+import numpy as np
 import openpyxl
+from itertools import chain
 from pathlib import Path
 import re
 import shutil
@@ -6,6 +8,10 @@ import uuid
 import os
 import time
 
+from bank_matching import match_deposits
+from invoice_reader import ColumnProjection, header_contains
+from bank_statement import load_bank_statement, write_bank_sheet
+
 
 # ----------------- Helper Functions -----------------
 
@@ -19,8 +25,12 @@ def safe_float(val):
     except:
         return 0.0
 
-def get_safe_dimensions(sheet):
-    """Safe way to get max_row and max_column in read_only mode"""
+def get_safe_dimensions(sheet, count_rows=True):
+    """
+    Safe way to get max_row and max_column in read_only mode.
+    With count_rows=False an unknown max_row is left as None instead of
+    parsing the whole sheet to count it (iter_rows reads to the end anyway).
+    """
     max_r = sheet.max_row
     max_c = sheet.max_column
     if max_r is None or max_c is None:
@@ -29,32 +39,21 @@ def get_safe_dimensions(sheet):
                 if len(row) > (max_c or 0):
                     max_c = len(row)
         if max_r is None:
+            if not count_rows:
+                return None, max_c or 0
             max_r = 0
             for row in sheet.iter_rows(values_only=True):
                 max_r += 1
     return max_r or 0, max_c or 0
 
-def extract_swiggy_start_day(filepath):
-    try:
-        wb = openpyxl.load_workbook(filepath, data_only=True, read_only=True)
-        sheet = wb["Summary"]
-        text = str(sheet["C12"].value)
-        wb.close()
-    except:
-        return None
-    m = re.search(r"(\d+)\s*.*?[-to]+\s*(\d+)", text, re.IGNORECASE)
+def parse_swiggy_start_day(text):
+    m = re.search(r"(\d+)\s*.*?[-to]+\s*(\d+)", str(text), re.IGNORECASE)
     if m:
         return int(m.group(1))
     return None
 
 
-def detect_platform(fp):
-    try:
-        wb = openpyxl.load_workbook(fp, data_only=True, read_only=True)
-        sheets = wb.sheetnames
-        wb.close()
-    except:
-        return None
+def detect_platform(sheets):
     if "Other charges and deductions" in sheets:
         return "Swiggy"
     if "Addition Deductions Details" in sheets:
@@ -62,6 +61,57 @@ def detect_platform(fp):
     return None
 
 
+def probe_invoice(fp):
+    """
+    Open an invoice (read-only) and collect the Summary values the recon needs up front:
+    platform, start day (Summary!C12), expected receipt (C14), total orders (C15)
+    and whether it has an Order Level sheet. The workbook is closed before returning,
+    so a month of invoices is never held open at once; the copy step reopens each file.
+    Returns None if the file cannot be opened.
+    """
+    try:
+        wb = openpyxl.load_workbook(fp, data_only=True, read_only=True)
+    except:
+        return None
+
+    probe = {
+        'fp': fp,
+        'platform': detect_platform(wb.sheetnames),
+        'start_day': None,
+        'expected_receipt': None,
+        'total_orders': None,
+        'has_order_level': "Order Level" in wb.sheetnames,
+    }
+    if probe['platform'] != "Swiggy":
+        wb.close()
+        return probe
+
+    try:
+        # C12..C15 of Summary in one read instead of a sheet parse per cell
+        summary = {row: value for row, (value,) in enumerate(
+            wb["Summary"].iter_rows(min_row=12, max_row=15, min_col=3, max_col=3, values_only=True), 12)}
+    except Exception as e:
+        print(f"Error reading Summary of {fp}: {e}")
+        summary = None
+
+    if summary is not None:
+        probe['start_day'] = parse_swiggy_start_day(summary.get(12))
+
+        val = summary.get(14)
+        if isinstance(val, str):
+            val = val.replace(",", "").replace("₹", "").strip()
+            try:
+                val = float(val)
+            except: pass
+        if isinstance(val, (int, float)):
+            probe['expected_receipt'] = float(val)
+
+        probe['total_orders'] = summary.get(15)
+
+    wb.close()
+    return probe
+
+
 def clear_all_D_sheets(wb):
     sheets_to_remove = [sh for sh in wb.sheetnames if sh.startswith("D1W") or sh.startswith("D2W")]
     for sh_name in sheets_to_remove:
@@ -120,47 +170,66 @@ def generate_week_ranges(first_start, first_end, last_start, last_end, max_day=3
     return week_ranges
 
 
-def copy_data(src, tgt, start_row):
-    max_row, max_col = get_safe_dimensions(src)
-    tgt.delete_rows(1, tgt.max_row or 100)
-    for r in range(start_row, max_row + 1):
-        for c in range(1, max_col + 1):
-            tgt.cell(row=r - start_row + 1, column=c).value = src.cell(row=r, column=c).value
-
-
-def extract_total_orders(fp):
-    try:
-        wb = openpyxl.load_workbook(fp, data_only=True, read_only=True)
-        sheet = wb["Summary"]
-        total_orders_value = sheet["C15"].value  # exact cell read
-        wb.close()
-        return total_orders_value
-    except Exception as e:
-        print(f"Error extracting Total Orders from {fp}: {e}")
-        return None
-
-
-def count_non_zero_complaints(sheet):
+def copy_data(src, tgt, start_row, tgt_start_row=1, columns=None):
     """
-    Count non-zero values in the Customer Complaints column (row 6 onwards).
-    Returns the count as an integer.
+    Copy src rows start_row..max_row into tgt from tgt_start_row down (tgt is cleared first).
+    Streams src with iter_rows and appends whole rows: read-only .cell() re-parses the
+    sheet XML on every call, which made the old cell-by-cell copy quadratic.
+    columns: header specs (see invoice_reader) of the columns to copy; None copies them all.
     """
-    complaints_col = None
-    max_r, max_c = get_safe_dimensions(sheet)
-    for col in range(1, max_c + 1):
-        cell_val = sheet.cell(row=5, column=col).value
-        if cell_val and "customer complaints" in str(cell_val).strip().lower():
-            complaints_col = col
-            break
-    if complaints_col is None:
-        print("Customer Complaints column not found in D1W sheet.")
-        return 0
-    count = 0
-    for row in range(6, max_r + 1):
-        value = sheet.cell(row=row, column=complaints_col).value
-        if isinstance(value, (int, float)) and value != 0:
-            count += 1
-    return count
+    max_row, max_col = get_safe_dimensions(src, count_rows=False)
+    tgt.delete_rows(1, tgt.max_row or 100)
+    if max_col == 0 or (max_row is not None and max_row < start_row):
+        return
+    rows = src.iter_rows(min_row=start_row, max_row=max_row, max_col=max_col, values_only=True)
+    if columns is not None:
+        projection = ColumnProjection(next(rows, ()), columns)
+        rows = chain([projection.header], map(projection, rows))
+    # First row placed explicitly so the appends that follow land right below it
+    # (delete_rows() above leaves the append position at the sheet's new last row)
+    first_row = next(rows, ())
+    for col_num, value in enumerate(first_row, 1):
+        tgt.cell(row=tgt_start_row, column=col_num).value = value
+    assert not first_row or tgt.max_row == tgt_start_row, f"{tgt.title}: rows would append below row {tgt.max_row}"
+    for row in rows:
+        tgt.append(row)
+
+
+SWIGGY_MAPPING = {
+    "Item sales (Delivered orders)": (["Item Total"], 2, "single"),
+    "Add:- Packing charges": (["Packaging Charges"], 2, "single"),
+    "Add:- Compensation paid for cancelled orders": (
+        ["Total Customer Paid", "Complaint & Cancellation Charges"], 1, "sub"),
+    "Less:- Discount": (["Restaurant Discounts", "Swiggy One Exclusive Offer Discount"], 2, "sum"),
+    "Add:- GST 5%": (["GST Collected"], 2, "single"),
+    "Swiggy One Fees": (["Swiggy One Fees"], 3, "single"),
+    "Call Center Service Fees": (["Call Center Charges"], 3, "single"),
+    "PocketHero Fee": (["Pocket Hero Fees"], 3, "single"),
+    "Platform Fee": (["Commission"], 3, "single"),
+    "Long Distance Fee": (["Long Distance Charges"], 3, "single"),
+    "Merchant Cancellation Charges": (["Restaurant Cancellation Charges"], 3, "single"),
+    "Paid by Restaurant": (["Customer Complaints"], 4, "single"),
+    "TDS deduction for aggrigators": (["TDS"], 4, "single"),
+    "TCS": (["TCS"], 4, "single"),
+    "GST collected and paid by swiggy": (["GST Deduction"], 4, "single"),
+    "Collection Charges": (["Payment Collection Charges"], 3, "single")
+}
+
+PARTIAL_MATCH_KEYWORDS = {
+    "Total Customer Paid": "Total Customer Paid",
+    "Complaint & Cancellation Charges": ["Complaint", "Cancellation"],
+    "Restaurant Discounts": "Restaurant Discount",
+    "Swiggy One Exclusive Offer Discount": "Swiggy One",
+    "TCS": "TCS"
+}
+
+# Every Order Level column the D1W totals and the Cashflow mapping read,
+# for D1W sheets that skip the full dump
+SWIGGY_D1W_COLUMNS = (
+    [name for headers, _, _ in SWIGGY_MAPPING.values() for name in headers]
+    + [header_contains(*(kw if isinstance(kw, list) else [kw])) for kw in PARTIAL_MATCH_KEYWORDS.values()]
+    + ["Item Total", "Order Status", header_contains("customer complaints")]
+)
 
 
 def map_values_to_cashflow(wb, data1_sheet, week):
@@ -170,33 +239,8 @@ def map_values_to_cashflow(wb, data1_sheet, week):
     data2_sheet_name = f"D2W{week}"
     data2_sheet = wb[data2_sheet_name] if data2_sheet_name in wb.sheetnames else None
 
-    mapping = {
-        "Item sales (Delivered orders)": (["Item Total"], 2, "single"),
-        "Add:- Packing charges": (["Packaging Charges"], 2, "single"),
-        "Add:- Compensation paid for cancelled orders": (
-            ["Total Customer Paid", "Complaint & Cancellation Charges"], 1, "sub"),
-        "Less:- Discount": (["Restaurant Discounts", "Swiggy One Exclusive Offer Discount"], 2, "sum"),
-        "Add:- GST 5%": (["GST Collected"], 2, "single"),
-        "Swiggy One Fees": (["Swiggy One Fees"], 3, "single"),
-        "Call Center Service Fees": (["Call Center Charges"], 3, "single"),
-        "PocketHero Fee": (["Pocket Hero Fees"], 3, "single"),
-        "Platform Fee": (["Commission"], 3, "single"),
-        "Long Distance Fee": (["Long Distance Charges"], 3, "single"),
-        "Merchant Cancellation Charges": (["Restaurant Cancellation Charges"], 3, "single"),
-        "Paid by Restaurant": (["Customer Complaints"], 4, "single"),
-        "TDS deduction for aggrigators": (["TDS"], 4, "single"),
-        "TCS": (["TCS"], 4, "single"),
-        "GST collected and paid by swiggy": (["GST Deduction"], 4, "single"),
-        "Collection Charges": (["Payment Collection Charges"], 3, "single")
-    }
-
-    partial_match_keywords = {
-        "Total Customer Paid": "Total Customer Paid",
-        "Complaint & Cancellation Charges": ["Complaint", "Cancellation"],
-        "Restaurant Discounts": "Restaurant Discount",
-        "Swiggy One Exclusive Offer Discount": "Swiggy One",
-        "TCS": "TCS"
-    }
+    mapping = SWIGGY_MAPPING
+    partial_match_keywords = PARTIAL_MATCH_KEYWORDS
 
     _, max_c_d1 = get_safe_dimensions(data1_sheet)
     headers = {str(data1_sheet.cell(row=5, column=c).value).strip(): c
@@ -282,108 +326,98 @@ def map_values_to_cashflow(wb, data1_sheet, week):
     print(f"Cashflow mapped for week {week}")
 
 
-def perform_calculations_on_data1(wb, data1_sheet, week, recon_path):
-    data1_sheet.insert_rows(1, 4)
-    item_total_col = None
-    order_status_col = None
-    for col_num, cell in enumerate(data1_sheet[5], 1):
-        if cell.value == 'Item Total': item_total_col = col_num
-        if cell.value == 'Order Status': order_status_col = col_num
-    if not item_total_col or not order_status_col:
-        print("Required columns missing")
-        return
+D1W_HEADER_ROW = 5  # Rows 1-4 are reserved for the totals below when D1W is copied
+D1W_STATUSES = ("delivered", "cancelled")
 
-    delivered = [0] * (82 - item_total_col)
-    cancelled = [0] * (82 - item_total_col)
 
-    for row in range(6, data1_sheet.max_row + 1):
-        status = str(data1_sheet.cell(row=row, column=order_status_col).value).strip().lower()
-        if status not in ["delivered", "cancelled"]: continue
-        target = delivered if status == "delivered" else cancelled
-        for i, col in enumerate(range(item_total_col, 82)):
-            val = data1_sheet.cell(row=row, column=col).value
-            if isinstance(val, (int, float)): target[i] += val
-
-    for i, col in enumerate(range(item_total_col, 82)):
-        data1_sheet.cell(row=4, column=col).value = delivered[i] + cancelled[i]
-        data1_sheet.cell(row=2, column=col).value = delivered[i]
-        data1_sheet.cell(row=1, column=col).value = cancelled[i]
-
-    for col in range(item_total_col, 82):
-        val = data1_sheet.cell(row=4, column=col).value
-        data1_sheet.cell(row=3, column=col).value = val * 1.18 if isinstance(val, (int, float)) else 0
+def scan_d1w(data1_sheet):
+    """
+    Read a D1W sheet once (header on row 5, orders from row 6) and return
+    the delivered/cancelled sums of every column from 'Item Total' to the
+    last filled header column, plus the count of non-zero Customer Complaints.
+    Sums are None when 'Item Total' or 'Order Status' is missing.
+    """
+    rows = data1_sheet.iter_rows(min_row=D1W_HEADER_ROW, values_only=True)
+    header = list(next(rows, ()))
+    while header and header[-1] in (None, ""):
+        header.pop()
+    orders = list(rows)
+
+    item_total_idx = order_status_idx = complaints_idx = None
+    for idx, value in enumerate(header):
+        if value == 'Item Total': item_total_idx = idx
+        if value == 'Order Status': order_status_idx = idx
+        if complaints_idx is None and value and "customer complaints" in str(value).strip().lower():
+            complaints_idx = idx
+
+    scan = {'item_total_col': None, 'delivered': None, 'cancelled': None, 'complaints': None}
+
+    if complaints_idx is not None:
+        scan['complaints'] = sum(1 for row in orders
+                                 if isinstance(row[complaints_idx], (int, float)) and row[complaints_idx] != 0)
+
+    if item_total_idx is None or order_status_idx is None:
+        return scan
+
+    width = len(header)
+    statuses = np.array([str(row[order_status_idx]).strip().lower() for row in orders], dtype=object)
+    block = np.zeros((len(orders), width - item_total_idx))
+    for r, row in enumerate(orders):
+        block[r] = [v if isinstance(v, (int, float)) else 0 for v in row[item_total_idx:width]]
+
+    def column_sums(mask):
+        selected = block[mask]
+        # Columns holding only whole numbers keep int totals, as the old loop did
+        integral = np.all(np.isfinite(selected) & (selected == np.trunc(selected)), axis=0)
+        return [int(v) if is_int else float(v) for v, is_int in zip(selected.sum(axis=0).tolist(), integral)]
+
+    scan['item_total_col'] = item_total_idx + 1
+    scan['delivered'] = column_sums(statuses == D1W_STATUSES[0])
+    scan['cancelled'] = column_sums(statuses == D1W_STATUSES[1])
+    return scan
 
-    print("Row1/Row2/Row3/Row4 calculations done for", data1_sheet.title)
-    map_values_to_cashflow(wb, data1_sheet, week)
 
+def perform_calculations_on_data1(wb, data1_sheet, week, recon_path):
+    """
+    Write the D1W totals (row 1 cancelled, 2 delivered, 3 total x 1.18, 4 total)
+    and map them to the Cashflow. Returns the non-zero Customer Complaints count
+    found in the same pass over the sheet.
+    """
+    scan = scan_d1w(data1_sheet)
+    if scan['complaints'] is None:
+        print("Customer Complaints column not found in D1W sheet.")
+    complaints = scan['complaints'] or 0
 
-def copy_bank_sheet_to_recon(bank_wb, recon_wb, bank_sheet_name=None, recon_bank_name='BANK'):
-    if recon_bank_name in recon_wb.sheetnames:
-        std = recon_wb[recon_bank_name]
-        recon_wb.remove(std)
-    bank_sheet_name = bank_sheet_name or bank_wb.sheetnames[0]
-    bank_sheet = bank_wb[bank_sheet_name]
-    recon_bank = recon_wb.create_sheet(recon_bank_name)
-    for i, row in enumerate(bank_sheet.iter_rows(values_only=True), 1):
-        for j, val in enumerate(row, 1):
-            recon_bank.cell(row=i, column=j).value = val
+    if scan['item_total_col'] is None:
+        print("Required columns missing")
+        return complaints
 
+    for col, (delivered, cancelled) in enumerate(zip(scan['delivered'], scan['cancelled']), scan['item_total_col']):
+        total = delivered + cancelled
+        data1_sheet.cell(row=4, column=col).value = total
+        data1_sheet.cell(row=3, column=col).value = total * 1.18
+        data1_sheet.cell(row=2, column=col).value = delivered
+        data1_sheet.cell(row=1, column=col).value = cancelled
 
-def extract_expected_receipt(fp):
-    try:
-        wb = openpyxl.load_workbook(fp, data_only=True, read_only=True)
-        sheet = wb["Summary"]
-        val = sheet["C14"].value
-        wb.close()
-        if isinstance(val, str):
-            val = val.replace(",", "").replace("₹", "").strip()
-            try:
-                val = float(val)
-            except Exception:
-                return None
-        if isinstance(val, (int, float)):
-            return float(val)
-        return None
-    except Exception as e:
-        print(f"Error extracting expected receipts from {fp}: {e}")
-        return None
+    print("Row1/Row2/Row3/Row4 calculations done for", data1_sheet.title)
+    map_values_to_cashflow(wb, data1_sheet, week)
+    return complaints
 
 
-def map_bank_to_actual_receipts_from_invoice_summary(recon_wb, week_expected_map, tolerance=10):
-    if "BANK" not in recon_wb.sheetnames or "Cashflow" not in recon_wb.sheetnames:
-        print("BANK or Cashflow sheet missing; skipping bank mapping.")
+def map_bank_to_actual_receipts_from_invoice_summary(recon_wb, week_expected_map, statement, tolerance=10):
+    """Map each week's expected receipt to a bank deposit of the statement (a BankStatement)"""
+    if "Cashflow" not in recon_wb.sheetnames:
+        print("Cashflow sheet missing; skipping bank mapping.")
         return
-    bank_sheet = recon_wb["BANK"]
     cashflow = recon_wb["Cashflow"]
-    deposit_col = None
-    deposit_labels = ["deposit amt.", "credit amount(inr)", "credit", "deposit", "amount"]
-    for col in range(1, bank_sheet.max_column + 1):
-        header = str(bank_sheet.cell(row=1, column=col).value).lower().strip() if bank_sheet.cell(row=1,
-                                                                                                  column=col).value else ""
-        for label in deposit_labels:
-            if label.lower() in header:
-                deposit_col = col
-                print(f"Found deposit column at column {col} with header: '{header}'")
-                break
-        if deposit_col:
-            break
-    if deposit_col is None:
+    if statement.deposit_col is None:
         print("Could not find deposit column.")
         return
-    bank_deposits = []
-    for row in range(2, bank_sheet.max_row + 1):
-        val = bank_sheet.cell(row=row, column=deposit_col).value
-        orig_val = val
-        if isinstance(val, str):
-            cleaned = val.replace(",", "").replace("\u200c", "").replace("₹", "").replace(" ", "")
-            cleaned = ''.join(c for c in cleaned if c.isdigit() or c == '.' or c == '-')
-            try:
-                val = float(cleaned)
-            except Exception:
-                val = None
-        if isinstance(val, (int, float)) and val != 0:
-            bank_deposits.append((val, row))
-            print(f"Bank deposit found at row {row} (raw: {orig_val}): {val}")
+    print(f"Found deposit column at column {statement.deposit_col + 1} with header: "
+          f"'{str(statement.header[statement.deposit_col]).lower().strip()}' (statement row {statement.header_row})")
+    # Deposit column parsed once into a sorted index; weeks look up their ±tolerance window by bisect
+    deposit_index = statement.deposit_index()
+    print(f"Bank deposits indexed: {len(deposit_index)}")
     actual_row = None
     max_cf_r, _ = get_safe_dimensions(cashflow)
     for row in range(1, max_cf_r + 1):
@@ -395,21 +429,21 @@ def map_bank_to_actual_receipts_from_invoice_summary(recon_wb, week_expected_map
     if not actual_row:
         print("Actual Receipts row not found.")
         return
+    # One-to-one: a deposit is never credited to two weeks
+    matches, unmatched = match_deposits(week_expected_map, deposit_index, tolerance)
     for week, expected in week_expected_map.items():
         col = 3 + (week - 1)
         print(f"Week {week}: expected receipt from invoice summary = {expected}")
-        closest, min_diff = None, float('inf')
-        for deposit, _ in bank_deposits:
-            diff = abs(deposit - expected)
-            if diff <= tolerance and diff < min_diff:
-                closest, min_diff = deposit, diff
-        if closest is not None:
+        if week in matches:
+            closest, bank_row, min_diff = matches[week]
             cashflow.cell(row=actual_row, column=col).value = closest
-            print(f"Week {week}: mapped deposit {closest} (diff={min_diff}) at Cashflow row {actual_row} col {col}")
+            print(f"Week {week}: mapped deposit {closest} from bank row {bank_row} (diff={min_diff}) at Cashflow row {actual_row} col {col}")
         else:
             # Assign 0 to clear out unmapped weeks
             cashflow.cell(row=actual_row, column=col).value = 0
             print(f"Week {week}: no matching bank deposit found within ±{tolerance}, setting cell to 0")
+    print(f"Unmatched bank deposits: {len(unmatched)} of {len(deposit_index)}")
+    return {'matches': matches, 'unmatched': unmatched}
 
 def safe_delete_bank_file(bank_file_path, retries=10, wait=0.5):
     bank_file_abs = os.path.abspath(bank_file_path)
@@ -458,7 +492,7 @@ def convert_summary_row_to_numbers(summary_sheet, row=6, start_col='C', end_col=
                 print(f"Could not convert cell at col {col} row {row}: {e}")
 
 
-def add_notepoints_based_on_bank(recon_wb, week_ranges, bank_file_path):
+def add_notepoints_based_on_bank(recon_wb, week_ranges, has_bank):
     cashflow = recon_wb["Cashflow"]
     discrepancies = recon_wb["Discrepancies"] if "Discrepancies" in recon_wb.sheetnames else None
 
@@ -498,7 +532,7 @@ def add_notepoints_based_on_bank(recon_wb, week_ranges, bank_file_path):
         return f"{n}{suffixes.get(n % 10, 'th')}"
 
     # Compose notepoint
-    if not bank_file_path:
+    if not has_bank:
         note = "1. Due to absence of Bank, actual receipts could not be mapped."
     elif unmapped_weeks:
         week_names = [f"{ordinal(w)} week" for w in unmapped_weeks]
@@ -558,8 +592,16 @@ def process_invoices_web(
         last_week_start=None,
         last_week_end=None,
         bank_file_path=None,
-        progress_callback=None
+        progress_callback=None,
+        bank_matched_only=False,
+        bank_statement=None,
+        full_dump=True
 ):
+    """
+    Swiggy recon. The bank statement comes either as a file (bank_file_path) or
+    already parsed (bank_statement, e.g. from the web app's statement cache).
+    full_dump=False: D1W sheets get only the Order Level columns the recon reads.
+    """
     try:
         folder = Path(invoice_folder_path)
 
@@ -571,13 +613,31 @@ def process_invoices_web(
         invoice_files = list(folder.glob("*.xlsx"))
         invoices = []
         for fp in invoice_files:
-            plat = detect_platform(fp)
-            if plat == "Swiggy":
-                d = extract_swiggy_start_day(fp)
-                if d is not None:
-                    invoices.append((d, fp, plat))
+            probe = probe_invoice(fp)
+            if probe and probe['platform'] == "Swiggy":
+                if probe['start_day'] is not None:
+                    invoices.append((probe['start_day'], fp, probe))
                 else:
                     print(f"Skipping {fp}: Could not parse start day")
+        return process_probed_invoices(
+            recon, invoices, output_path, client_name, month,
+            first_week_start, first_week_end, last_week_start, last_week_end,
+            bank_file_path, progress_callback, bank_matched_only, bank_statement, full_dump
+        )
+
+    except Exception as e:
+        print(f"Error during processing: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {'success': False, 'message': f'Processing error: {str(e)}'}
+
+
+def process_probed_invoices(recon, invoices, output_path, client_name, month,
+                            first_week_start, first_week_end, last_week_start, last_week_end,
+                            bank_file_path, progress_callback, bank_matched_only=False,
+                            bank_statement=None, full_dump=True):
+    """Build the Swiggy recon from invoices already probed by probe_invoice()"""
+    try:
         if not invoices:
             return {
                 'success': False,
@@ -612,7 +672,7 @@ def process_invoices_web(
         week_complaints_map = {}
 
         total_invoices = len(invoices)
-        for idx, (d, fp, plat) in enumerate(invoices):
+        for idx, (d, fp, probe) in enumerate(invoices):
             if progress_callback:
                 # Progress from 10% to 90%
                 percent = 10 + int((idx / total_invoices) * 80)
@@ -624,49 +684,27 @@ def process_invoices_web(
                 continue
             week_map[fp] = week
             print(f"\nProcessing {fp} → Week {week}")
-            
-            # OPTIMIZATION: Open workbook ONCE
-            wb_invoice = openpyxl.load_workbook(fp, data_only=True, read_only=True)
-            
-            # Extract Expected Receipt from Summary sheet directly
-            expected_receipt = None
-            try:
-                sheet_sum = wb_invoice["Summary"]
-                val = sheet_sum["C14"].value
-                if isinstance(val, str):
-                    val = val.replace(",", "").replace("₹", "").strip()
-                    try:
-                        val = float(val)
-                    except: pass
-                if isinstance(val, (int, float)):
-                    expected_receipt = float(val)
-            except Exception as e:
-                print(f"Error extracting expected receipts from {fp}: {e}")
 
+            # Summary values were read by probe_invoice() when the file was first opened
+            expected_receipt = probe['expected_receipt']
             if expected_receipt is not None:
                 week_expected_map[week] = expected_receipt
                 print(f"Invoice {fp} Week {week}: Extracted expected receipt = {expected_receipt}")
-                
-            # Copy data sheets
-            ol = wb_invoice["Order Level"]
-            add = wb_invoice["Other charges and deductions"]
+
+            # Copy data sheets, one invoice open at a time
+            if not probe['has_order_level']:
+                raise KeyError(f"Worksheet Order Level does not exist in {fp}")
             d1, d2 = ensure_sheet(recon, f"D1W{week}"), ensure_sheet(recon, f"D2W{week}")
-            copy_data(ol, d1, 3)
-            copy_data(add, d2, 4)
-            
-            # Extract Total Orders directly
-            total_orders = None
+            wb_invoice = openpyxl.load_workbook(fp, data_only=True, read_only=True)
             try:
-                sheet_sum = wb_invoice["Summary"]
-                total_orders = sheet_sum["C15"].value
-            except Exception as e:
-                print(f"Error extracting Total Orders from {fp}: {e}")
-
-            wb_invoice.close()
-            
-            perform_calculations_on_data1(recon, d1, week, output_path)
-
-            complaint_count = count_non_zero_complaints(d1)
+                copy_data(wb_invoice["Order Level"], d1, 3, tgt_start_row=5,  # Leave rows 1-4 for the D1W totals
+                          columns=None if full_dump else SWIGGY_D1W_COLUMNS)
+                copy_data(wb_invoice["Other charges and deductions"], d2, 4)
+            finally:
+                wb_invoice.close()
+            total_orders = probe['total_orders']
+
+            complaint_count = perform_calculations_on_data1(recon, d1, week, output_path)
             week_complaints_map[week] = complaint_count
             print(f"Week {week}: {complaint_count} non-zero complaints found")
 
@@ -689,23 +727,27 @@ def process_invoices_web(
         summary_sheet = recon["Summary"]
         convert_summary_row_to_numbers(summary_sheet, row=6, start_col='C', end_col='G')
 
-        bank_wb = None
+        has_bank = bool(bank_file_path) or bank_statement is not None
         try:
-            if bank_file_path:
-                bank_wb = openpyxl.load_workbook(bank_file_path, data_only=False, read_only=True)
-                copy_bank_sheet_to_recon(bank_wb, recon)
+            if has_bank:
+                statement = bank_statement
+                if statement is None:
+                    statement = load_bank_statement(bank_file_path)
+                print(f"Bank statement loaded: {len(statement)} rows under the header")
+                bank_match = map_bank_to_actual_receipts_from_invoice_summary(
+                    recon, week_expected_map, statement, tolerance=10)
+                matched_rows = None
+                if bank_matched_only:
+                    matched_rows = [bank_row for _, bank_row, _ in (bank_match or {}).get('matches', {}).values()]
+                write_bank_sheet(recon, statement, only_rows=matched_rows)
                 print("Bank sheet imported into reconciliation file.")
-                map_bank_to_actual_receipts_from_invoice_summary(recon, week_expected_map, tolerance=10)
         except Exception as bank_e:
             print(f"Failed to process bank file: {bank_e}")
-        finally:
-            if bank_wb is not None:
-                bank_wb.close()
 
         if month:
             replace_month_in_sheets(recon, month)
 
-        add_notepoints_based_on_bank(recon, week_ranges, bank_file_path)
+        add_notepoints_based_on_bank(recon, week_ranges, has_bank)
 
         # Optional: Call this to ensure images from template copied (if necessary)
         # copy_images_from_template(template_recon_path, output_path)
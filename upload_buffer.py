@@ -0,0 +1,123 @@
+"""
+Seekable buffers for uploaded invoices.
+Engines open uploads straight from memory instead of saving them into the
+output folder first; streams that cannot seek are spooled, spilling to a
+private temp directory only above a size threshold. Multi-file uploads can
+be read in worker processes, with results kept in upload order.
+"""
+
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+SPOOL_MAX_MEMORY = 32 * 1024 * 1024  # Bytes kept in memory before a spooled upload spills to disk
+PARALLEL_READ_MIN_BYTES = 2 * 1024 * 1024  # Smaller batches read faster than worker processes start
+
+
+class UploadSpool:
+    """
+    Context manager handing out seekable buffers for uploads.
+
+        with UploadSpool() as spool:
+            wb = openpyxl.load_workbook(spool.open(upload), read_only=True)
+
+    Uploads already held in a seekable stream (UploadedFile, werkzeug's spooled
+    FileStorage) are used as-is, and uploads the app spilled to disk are opened
+    from their path (closed on exit). Anything else is copied into a
+    SpooledTemporaryFile; the private directory it may spill into is removed
+    on exit, whether or not the engine succeeded.
+    """
+
+    def __init__(self, max_memory=SPOOL_MAX_MEMORY):
+        self.max_memory = max_memory
+        self._buffers = []
+        self._dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def open(self, upload):
+        """Seekable binary buffer positioned at the start of an upload"""
+        path = getattr(upload, 'path', None)
+        if path:
+            buffer = open(path, 'rb')
+            self._buffers.append(buffer)
+            return buffer
+        stream = getattr(upload, 'stream', upload)
+        if isinstance(stream, (bytes, bytearray)):
+            return io.BytesIO(stream)
+        try:
+            if stream.seekable():
+                stream.seek(0)
+                return stream
+        except (AttributeError, ValueError, OSError):
+            pass
+
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix='recon_upload_')  # 0700, outside the download folder
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.max_memory, dir=self._dir)
+        self._buffers.append(buffer)
+        shutil.copyfileobj(stream, buffer)
+        buffer.seek(0)
+        return buffer
+
+    def close(self):
+        for buffer in self._buffers:
+            buffer.close()
+        self._buffers = []
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+
+def _buffer_size(buffer):
+    size = buffer.seek(0, io.SEEK_END)
+    buffer.seek(0)
+    return size
+
+
+def _read_in_worker(reader, name, data):
+    return reader(name, io.BytesIO(data))
+
+
+def iter_read_uploads(reader, uploads, spool, read_workers=None):
+    """
+    Yield reader(name, buffer) for each (name, upload) pair, in upload order.
+
+    reader must be a module-level function (it may run in a worker process,
+    where it gets a BytesIO copy of the upload). read_workers caps those
+    processes; None means one per core, or none when this already runs in a
+    worker process (the app's engine pool). Batches under
+    PARALLEL_READ_MIN_BYTES are always read here. At most read_workers copies
+    are handed to workers at a time.
+    """
+    buffers = [(name, spool.open(upload)) for name, upload in uploads]
+    if read_workers is None:
+        read_workers = 1 if multiprocessing.parent_process() is not None else (os.cpu_count() or 1)
+    if sum(_buffer_size(buffer) for _, buffer in buffers) < PARALLEL_READ_MIN_BYTES:
+        read_workers = 1
+    read_workers = min(read_workers, len(buffers))
+
+    if read_workers <= 1:
+        for name, buffer in buffers:
+            yield reader(name, buffer)
+        return
+
+    print(f"⚙️  Reading {len(buffers)} uploads with {read_workers} worker processes")
+    with ProcessPoolExecutor(max_workers=read_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = deque()
+        for name, buffer in buffers:
+            if len(pending) == read_workers:
+                yield pending.popleft().result()
+            buffer.seek(0)
+            pending.append(pool.submit(_read_in_worker, reader, name, buffer.read()))
+        while pending:
+            yield pending.popleft().result()
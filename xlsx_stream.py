@@ -0,0 +1,329 @@
+"""
+Direct XML reader for large invoice workbooks.
+Opens the xlsx zip and stream-parses the worksheet XML with iterparse instead
+of going through openpyxl's read-only worksheets. Only the columns a caller
+asks for are decoded (shared string lookup, number / date conversion); the
+shared string table is parsed lazily, only as far as the highest index used.
+Values match openpyxl's read_only=True, data_only=True reads.
+"""
+
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse, fromstring
+
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, CALENDAR_MAC_1904
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+CONTENT_TYPES_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+DOC_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+ROW_TAG = MAIN_NS + "row"
+VALUE_TAG = MAIN_NS + "v"
+INLINE_STRING_TAG = MAIN_NS + "is"
+TEXT_TAG = MAIN_NS + "t"
+RUN_TAG = MAIN_NS + "r"
+STRING_ITEM_TAG = MAIN_NS + "si"
+DIMENSION_TAG = MAIN_NS + "dimension"
+SHEET_DATA_TAG = MAIN_NS + "sheetData"
+
+DIGITS = "0123456789"
+_column_numbers = {}
+
+
+def column_number(ref):
+    """1-based column of a cell reference such as 'AB12'"""
+    letters = ref.rstrip(DIGITS)
+    number = _column_numbers.get(letters)
+    if number is None:
+        number = _column_numbers[letters] = column_index_from_string(letters)
+    return number
+
+
+def string_text(node):
+    """Plain text of an <si> / <is> element: its <t> plus the <t> of every rich text run"""
+    snippets = []
+    plain = node.find(TEXT_TAG)
+    if plain is not None and plain.text is not None:
+        snippets.append(plain.text)
+    for run in node.iterfind(RUN_TAG):
+        text = run.findtext(TEXT_TAG)
+        if text is not None:
+            snippets.append(text)
+    return "".join(snippets)
+
+
+def _cast_number(value):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _part_rels(archive, part):
+    """{relationship id: (type, archive path)} of a package part"""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", name + ".rels")
+    if rels_path not in archive.namelist():
+        return {}
+    rels = {}
+    for rel in fromstring(archive.read(rels_path)).iter(REL_NS + "Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            path = target[1:]
+        else:
+            path = posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get("Id")] = (rel.get("Type"), path)
+    return rels
+
+
+class SharedStrings:
+    """
+    The workbook's shared string table, parsed on first use and only up to
+    the highest index looked up so far.
+    """
+
+    def __init__(self, archive, path):
+        self._archive = archive
+        self._path = path
+        self._strings = []
+        self._source = None
+        self._pending = None
+
+    def __getitem__(self, idx):
+        if idx >= len(self._strings):
+            self._load_until(idx)
+        return self._strings[idx]
+
+    def _load_until(self, idx):
+        if self._path is None:
+            raise IndexError(f"Shared string {idx} requested but the workbook has no shared strings")
+        if self._pending is None:
+            self._source = self._archive.open(self._path)
+            self._pending = iterparse(self._source)
+        for _, node in self._pending:
+            if node.tag == STRING_ITEM_TAG:
+                self._strings.append(string_text(node).replace("x005F_", ""))
+                node.clear()
+                if idx < len(self._strings):
+                    return
+        raise IndexError(f"Shared string {idx} not in the table ({len(self._strings)} strings)")
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+        self._source = self._pending = None
+
+
+class StreamWorkbook:
+    """
+    Read-only workbook over an xlsx path or binary stream, with the parts of
+    openpyxl's read-only API the engines use:
+
+        wb = StreamWorkbook(path)
+        if "Order Level" in wb.sheetnames:
+            rows = wb["Order Level"].iter_rows(min_row=7, values_only=True)
+        wb.close()
+
+    Formula cells give their cached value, as with data_only=True.
+    """
+
+    def __init__(self, source):
+        self._archive = zipfile.ZipFile(source)
+        package_rels = _part_rels(self._archive, "")
+        workbook_part = next(
+            (path for rel_type, path in package_rels.values() if rel_type.endswith("/officeDocument")),
+            "xl/workbook.xml"
+        )
+        workbook_rels = _part_rels(self._archive, workbook_part)
+        parts = {rel_type.rsplit("/", 1)[-1]: path for rel_type, path in workbook_rels.values()}
+
+        root = fromstring(self._archive.read(workbook_part))
+        properties = root.find(MAIN_NS + "workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self.epoch = CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+
+        self._sheets = {}
+        for sheet in root.iter(MAIN_NS + "sheet"):
+            rel_type, path = workbook_rels.get(sheet.get(DOC_REL_ID), ("", None))
+            if rel_type.endswith("/worksheet"):
+                self._sheets[sheet.get("name")] = path
+        self.sheetnames = list(self._sheets)
+
+        strings_path = parts.get("sharedStrings") or self._content_type_part("sharedStrings+xml")
+        styles_path = parts.get("styles") or ("xl/styles.xml" if "xl/styles.xml" in self._archive.namelist() else None)
+        self.shared_strings = SharedStrings(self._archive, strings_path)
+        self.date_styles, self.timedelta_styles = self._read_number_styles(styles_path)
+
+    def _content_type_part(self, suffix):
+        """Path of the first part whose [Content_Types].xml override ends with suffix"""
+        if "[Content_Types].xml" not in self._archive.namelist():
+            return None
+        for override in fromstring(self._archive.read("[Content_Types].xml")).iter(CONTENT_TYPES_NS + "Override"):
+            if override.get("ContentType", "").endswith(suffix):
+                return override.get("PartName").lstrip("/")
+        return None
+
+    def _read_number_styles(self, styles_path):
+        """Indexes of the cell styles whose number format shows a date / a duration"""
+        date_styles, timedelta_styles = set(), set()
+        if styles_path is None:
+            return date_styles, timedelta_styles
+        root = fromstring(self._archive.read(styles_path))
+        custom = {int(fmt.get("numFmtId")): fmt.get("formatCode") for fmt in root.iter(MAIN_NS + "numFmt")}
+        cell_xfs = root.find(MAIN_NS + "cellXfs")
+        for idx, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+            fmt_id = int(xf.get("numFmtId", 0))
+            fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+            if is_date_format(fmt):
+                date_styles.add(idx)
+            if is_timedelta_format(fmt):
+                timedelta_styles.add(idx)
+        return date_styles, timedelta_styles
+
+    def __getitem__(self, name):
+        if name not in self._sheets:
+            raise KeyError(f"Worksheet {name} does not exist.")
+        return StreamSheet(self, name, self._sheets[name])
+
+    def __contains__(self, name):
+        return name in self._sheets
+
+    def open_part(self, path):
+        return self._archive.open(path)
+
+    def close(self):
+        self.shared_strings.close()
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class StreamSheet:
+    """
+    One worksheet of a StreamWorkbook. iter_rows() pads and fills rows the way
+    openpyxl's read-only worksheets do (to the sheet's recorded dimension), and
+    takes decode=, a set of 1-based columns: cells outside it are yielded as
+    None without being converted.
+    """
+
+    def __init__(self, workbook, title, path):
+        self.parent = workbook
+        self.title = title
+        self._path = path
+        self._dimensions = None
+        self._shared_strings = workbook.shared_strings
+        self._date_styles = workbook.date_styles
+
+    def _read_dimensions(self):
+        if self._dimensions is None:
+            self._dimensions = (None, None)
+            with self.parent.open_part(self._path) as source:
+                # Start events: an unsized sheet stops at <sheetData>, not after parsing it
+                for _, element in iterparse(source, events=("start",)):
+                    if element.tag == DIMENSION_TAG:
+                        _, _, max_col, max_row = range_boundaries(element.get("ref"))
+                        self._dimensions = (max_row, max_col)
+                        break
+                    if element.tag == SHEET_DATA_TAG:
+                        break  # Dimension missing
+        return self._dimensions
+
+    @property
+    def max_row(self):
+        return self._read_dimensions()[0]
+
+    @property
+    def max_column(self):
+        return self._read_dimensions()[1]
+
+    def _cell_value(self, cell):
+        data_type = cell.get("t", "n")
+        if data_type == "s":  # Most text in an invoice is in the shared string table
+            value = cell.findtext(VALUE_TAG)
+            return self._shared_strings[int(value)] if value else None
+        if data_type == "inlineStr":
+            child = cell.find(INLINE_STRING_TAG)
+            return string_text(child) if child is not None else None
+
+        value = cell.findtext(VALUE_TAG) or None
+        if value is None:
+            return None
+        if data_type == "n":
+            value = _cast_number(value)
+            style = cell.get("s")
+            if style and int(style) in self._date_styles:
+                try:
+                    return from_excel(value, self.parent.epoch, timedelta=int(style) in self.parent.timedelta_styles)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "d":
+            return from_ISO8601(value)
+        return value  # "str" (formula text result) and "e" (error code)
+
+    def _parse_rows(self, decode):
+        """(row number, last column in the row, [(column, value) of decoded cells])"""
+        column_numbers = _column_numbers
+        cell_value = self._cell_value
+        row_number = 0
+        with self.parent.open_part(self._path) as source:
+            for _, element in iterparse(source):
+                if element.tag != ROW_TAG:
+                    continue
+                ref = element.get("r")
+                row_number = int(float(ref)) if ref else row_number + 1
+
+                column = 0
+                cells = []
+                for cell in element:
+                    ref = cell.get("r")
+                    if ref:
+                        column = column_numbers.get(ref.rstrip(DIGITS)) or column_number(ref)
+                    else:
+                        column += 1
+                    if decode is None or column in decode:
+                        cells.append((column, cell_value(cell)))
+                element.clear()
+                yield row_number, column, cells
+
+    def iter_rows(self, min_row=None, max_row=None, max_col=None, values_only=True, decode=None):
+        """Value tuples for rows min_row..max_row, missing rows and cells filled with None"""
+        if not values_only:
+            raise ValueError("StreamSheet only yields cell values (values_only=True)")
+        min_row = min_row or 1
+        max_row = max_row or self.max_row
+        max_col = max_col or self.max_column
+        empty_row = (None,) * max_col if max_col is not None else []  # openpyxl's filler when unsized
+
+        counter = min_row
+        row_number = 1
+        for row_number, last_column, cells in self._parse_rows(decode):
+            if max_row is not None and row_number > max_row:
+                break
+            while counter < row_number:  # Rows missing from the XML
+                counter += 1
+                yield empty_row
+            if counter <= row_number:
+                counter += 1
+                if not last_column and not max_col:
+                    yield ()
+                    continue
+                width = max_col or last_column
+                row = [None] * width
+                for column, value in cells:
+                    if column <= width:
+                        row[column - 1] = value
+                yield tuple(row)
+
+        if max_row is not None and max_row < row_number:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
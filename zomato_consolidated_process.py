@@ -3,7 +3,7 @@ import os
 import shutil
 import gc
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 import calendar
 
 # Import helpers from process_invoices
@@ -11,15 +11,19 @@ from process_invoices import (
     calculate_week_structure, 
     ensure_sheet, 
     clear_all_D_sheets, 
-    perform_calculations_on_data1, 
     map_values_to_cashflow, 
-    count_total_orders_from_d1w, 
-    count_nonzero_compensation, 
-    map_commissionable_value_to_summary,
+    OrderLevelTotals,
+    write_order_level_to_d1w,
+    map_order_totals_to_summary,
     replace_month_in_sheets,
     parse,
-    get_safe_dimensions
+    DateColumnParser,
+    get_safe_dimensions,
+    ZOMATO_D1W_COLUMNS,
+    ORDER_COUNT_COLUMNS,
+    ORDER_FILTER_COLUMNS
 )
+from invoice_reader import SheetReader, open_invoice_workbook
 import re
 
 def safe_float(val):
@@ -50,52 +54,134 @@ def parse_deduction_period(period_str):
         pass
     return None, None
 
-def copy_data_with_date_range(src, tgt, start_row, start_date, end_date):
+def partition_order_level_by_week(src, start_row, week_structure, date_parser=None, columns=None):
     """
-    Copies rows from src to tgt if 'Order Date' falls within [start_date, end_date].
-    Assumes header is at start_row.
+    One streaming pass over the monthly Order Level sheet (header at start_row).
+    Each row goes to the OrderLevelTotals of every week whose range holds its
+    'Order Date'; rows outside every week are skipped.
+    columns: header specs to keep (see invoice_reader), None = every column.
+    Returns the buckets by week_num, or None when the sheet has no 'Order Date' column.
     """
+    reader = SheetReader(src, start_row, columns, leading=ORDER_COUNT_COLUMNS, reads=ORDER_FILTER_COLUMNS)
+
     order_date_col = None
-    _, max_c = get_safe_dimensions(src)
-    for col_num in range(1, max_c + 1):
-        header = str(src.cell(row=start_row, column=col_num).value or "").strip().lower()
-        if header == "order date":
+    for col_num, value in enumerate(reader.source_header, 1):
+        header_text = str(value or "").strip().lower()
+        if header_text == "order date" and order_date_col is None:
             order_date_col = col_num
-            break
 
     if not order_date_col:
         print("  ⚠️ Order Date column not found in consolidated file")
-        return 0
+        return None
 
-    # Write headers
-    for c in range(1, max_c + 1):
-        tgt.cell(row=1, column=c).value = src.cell(row=start_row, column=c).value
+    parse_date = date_parser or DateColumnParser()
+    buckets = {week['week_num']: OrderLevelTotals(reader.header) for week in week_structure}
 
-    tgt_row = 2
-    copied_count = 0
-    data_start_row = start_row + 1
-    
-    # Standardize range to date objects
-    s_date = start_date.date() if isinstance(start_date, datetime) else start_date
-    e_date = end_date.date() if isinstance(end_date, datetime) else end_date
+    # Day -> weeks lookup, so routing a row is one dict hit instead of a scan per week
+    weeks_by_day = {}
+    for week in week_structure:
+        day = week['start_date'].date()
+        while day <= week['end_date'].date():
+            weeks_by_day.setdefault(day, []).append(buckets[week['week_num']])
+            day += timedelta(days=1)
 
-    for row_values in src.iter_rows(min_row=data_start_row, values_only=True):
+    def order_date(row_values):
         try:
             date_raw = row_values[order_date_col - 1]
-            if not date_raw or date_raw == '#REF!': continue
-            
-            row_date_dt = parse(date_raw)
-            row_date = row_date_dt.date()
-            
-            if s_date <= row_date <= e_date:
-                for col_idx, val in enumerate(row_values, 1):
-                    tgt.cell(row=tgt_row, column=col_idx).value = val
-                tgt_row += 1
-                copied_count += 1
-        except:
+        except IndexError:
+            return None
+        if not date_raw or date_raw == '#REF!': return None
+        row_date_dt = parse_date.get(date_raw)
+        return row_date_dt.date() if row_date_dt is not None else None
+
+    def weeks_of(row_values):
+        row_date = order_date(row_values)
+        return weeks_by_day.get(row_date) if row_date is not None else None
+
+    for targets, row_values in reader.keyed_rows(weeks_of):
+        for totals in targets:
+            totals.add(row_values)
+    return buckets
+
+ADS_SECTIONS = [
+    ("addition type", "ADDITION"),
+    ("deduction type", "DEDUCTION"),
+    ("investments in hyperpure", "OTHER"),
+    ("other deductions", "OTHER"),
+]
+
+
+def segregate_ads_by_week(src_ads, week_structure, ads_weekly_totals):
+    """
+    Add each ADS line of the 'Addition Deductions Details' sheet to its week.
+    Streams the sheet once as a small state machine: column B switches the
+    current section, the first other row is searched for the Type / period /
+    Total amount headers, and every later ADS row in the Addition (deducted)
+    or Deduction (added) sections is attributed via parse_deduction_period.
+    """
+    current_section = None
+    type_col, period_col, total_col = -1, -1, -1
+
+    def value_at(row_values, col):
+        return row_values[col - 1] if 1 <= col <= len(row_values) else None
+
+    for row_values in src_ads.iter_rows(values_only=True):
+        row_val_b = str(value_at(row_values, 2) or "").strip().lower()
+
+        # Section headers
+        section = next((name for marker, name in ADS_SECTIONS if marker in row_val_b), None)
+        if section:
+            current_section = section
             continue
-            
-    return copied_count
+
+        # Column headers (only looked for until the Type column is known)
+        if type_col == -1:
+            for idx, value in enumerate(row_values[:14], 1):
+                h = str(value or "").strip().lower()
+                if "type" == h: type_col = idx
+                if "deduction time period" in h or "order date" in h: period_col = idx
+                if "total amount" in h: total_col = idx
+            continue
+
+        # ADS rows
+        if current_section not in ["ADDITION", "DEDUCTION"]:
+            continue
+        type_val = str(value_at(row_values, type_col) or "").strip().upper()
+        if type_val != "ADS":
+            continue
+
+        period_val = value_at(row_values, period_col)
+        amount = safe_float(value_at(row_values, total_col))
+
+        # Use deduction period if available, else try to find any date in the row
+        p_start, p_end = parse_deduction_period(period_val)
+        if not p_start:
+            # Fallback: maybe it's a simple date
+            try:
+                dt = parse(period_val).date()
+                p_start, p_end = dt, dt
+            except: pass
+
+        if not p_start:
+            continue
+
+        # Match to week
+        for week in week_structure:
+            ws, we = week['start_date'].date(), week['end_date'].date()
+            if ws <= p_start <= we or (p_start <= ws and p_end >= we):
+                # DEDUCT if in Addition section, ADD if in Deduction section
+                if current_section == "ADDITION":
+                    ads_weekly_totals[week['week_num']] -= amount
+                    print(f"  ➖ Deducted Addition Ad: {amount} for Week {week['week_num']}")
+                else:
+                    ads_weekly_totals[week['week_num']] += amount
+                    print(f"  ➕ Added Deduction Ad: {amount} for Week {week['week_num']}")
+                break
+        else:
+            print(f"  ⚠️ Could not match Ad period '{period_val}' to any week")
+
+    return ads_weekly_totals
+
 
 def process_zomato_consolidated(
     invoice_folder,
@@ -107,11 +193,15 @@ def process_zomato_consolidated(
     first_week_end=None,
     last_week_start=None,
     last_week_end=None,
-    progress_callback=None
+    progress_callback=None,
+    full_dump=True,
+    reader_backend="openpyxl"
 ):
     """
     Consolidated Zomato Reconciliation Logic.
     Splits one monthly file into weekly subsheets based on user-provided week ranges.
+    full_dump=False: D1W sheets get only the Order Level columns the recon reads.
+    reader_backend: how the consolidated file is read (invoice_reader.READER_BACKENDS).
     """
     try:
         if progress_callback: progress_callback(5)
@@ -132,7 +222,7 @@ def process_zomato_consolidated(
         
         consolidated_fp = files[0]
         print(f"📊 Processing Consolidated File: {consolidated_fp.name}")
-        wb_source = openpyxl.load_workbook(consolidated_fp, data_only=True, read_only=True)
+        wb_source = open_invoice_workbook(consolidated_fp, reader_backend)
         
         # Find Order level sheet
         possible_order_sheets = ["Order Level", "Order level", "Order Details", "Orders"]
@@ -156,7 +246,13 @@ def process_zomato_consolidated(
         if client_name:
             summary_sheet.cell(row=1, column=2).value = client_name
 
-        # 4. Process Each Week
+        # 4. Split the month into weeks in a single pass
+        print("\n🔄 Partitioning Order Level rows by week...")
+        week_buckets = partition_order_level_by_week(
+            src_ol, 7, week_structure, columns=None if full_dump else ZOMATO_D1W_COLUMNS
+        )
+
+        # 5. Process Each Week
         for idx, week in enumerate(week_structure):
             if progress_callback:
                 progress_callback(20 + int((idx/total_weeks) * 70))
@@ -166,31 +262,27 @@ def process_zomato_consolidated(
             
             # Create D1W sheet
             d1 = ensure_sheet(recon, f"D1W{week_num}")
+            if week_buckets is None:
+                continue
+
+            totals = week_buckets[week_num]
+            print(f"  ✅ Extracted {len(totals.rows)} rows")
             
-            # Filter and copy data for this week range
-            copied = copy_data_with_date_range(src_ol, d1, 7, week['start_date'], week['end_date'])
-            print(f"  ✅ Extracted {copied} rows")
-            
-            if copied > 0:
+            if totals.rows:
                 # Perform standard Zomato calculations and mapping
-                perform_calculations_on_data1(recon, d1, week_num, output_path)
+                write_order_level_to_d1w(d1, totals)
                 map_values_to_cashflow(recon, d1, week_num)
                 
                 # Update Summary
                 summary_col = 3 + (week_num - 1)
                 summary_sheet.cell(row=4, column=summary_col).value = week['label']
-                
-                total_orders = count_total_orders_from_d1w(d1, header_row=5)
-                summary_sheet.cell(row=6, column=summary_col).value = total_orders
-                
-                comp_orders = count_nonzero_compensation(d1, data_row=5)
-                summary_sheet.cell(row=12, column=summary_col).value = comp_orders
-                
-                map_commissionable_value_to_summary(summary_sheet, d1, week_num)
-
-                map_commissionable_value_to_summary(summary_sheet, d1, week_num)
+                map_order_totals_to_summary(summary_sheet, totals, week_num)
+            else:
+                # Weeks without orders get no aggregate rows, so their header stays on row 1
+                for col_num, value in enumerate(totals.header, 1):
+                    d1.cell(row=1, column=col_num).value = value
         
-        # 5. Process Ads Segregation
+        # 6. Process Ads Segregation
         print("\n📢 Processing Ads Segregation...")
         ads_weekly_totals = {w['week_num']: 0.0 for w in week_structure}
         
@@ -201,73 +293,11 @@ def process_zomato_consolidated(
                 break
         
         if src_ads:
-            # Find the starting row of sections
-            current_section = None
-            type_col, period_col, total_col = -1, -1, -1
-            
-            max_r_ads, _ = get_safe_dimensions(src_ads)
-            for row in range(1, max_r_ads + 1):
-                row_val_b = str(src_ads.cell(row=row, column=2).value or "").strip().lower()
-                
-                # Check for section headers
-                if "addition type" in row_val_b:
-                    current_section = "ADDITION"
-                    continue
-                elif "deduction type" in row_val_b:
-                    current_section = "DEDUCTION"
-                    continue
-                elif "investments in hyperpure" in row_val_b or "other deductions" in row_val_b:
-                    current_section = "OTHER"
-                    continue
-
-                # Look for column headers if not found yet
-                if type_col == -1:
-                    headers = [str(src_ads.cell(row=row, column=c).value or "").strip().lower() for c in range(1, 15)]
-                    for idx, h in enumerate(headers, 1):
-                        if "type" == h: type_col = idx
-                        if "deduction time period" in h or "order date" in h: period_col = idx
-                        if "total amount" in h: total_col = idx
-                    continue
-                
-                # Process ADS rows
-                if current_section in ["ADDITION", "DEDUCTION"] and type_col != -1:
-                    type_val = str(src_ads.cell(row=row, column=type_col).value or "").strip().upper()
-                    if type_val == "ADS":
-                        period_val = src_ads.cell(row=row, column=period_col).value
-                        amount = safe_float(src_ads.cell(row=row, column=total_col).value)
-                        
-                        # Use deduction period if available, else try to find any date in the row
-                        p_start, p_end = parse_deduction_period(period_val)
-                        if not p_start:
-                            # Fallback: maybe it's a simple date
-                            try:
-                                dt = parse(period_val).date()
-                                p_start, p_end = dt, dt
-                            except: pass
-
-                        if p_start:
-                            # Match to week
-                            matched = False
-                            for week in week_structure:
-                                ws, we = week['start_date'].date(), week['end_date'].date()
-                                if ws <= p_start <= we or (p_start <= ws and p_end >= we):
-                                    # DEDUCT if in Addition section, ADD if in Deduction section
-                                    if current_section == "ADDITION":
-                                        ads_weekly_totals[week['week_num']] -= amount
-                                        print(f"  ➖ Deducted Addition Ad: {amount} for Week {week['week_num']}")
-                                    else:
-                                        ads_weekly_totals[week['week_num']] += amount
-                                        print(f"  ➕ Added Deduction Ad: {amount} for Week {week['week_num']}")
-                                    matched = True
-                                    break
-                            if not matched:
-                                print(f"  ⚠️ Could not match Ad period '{period_val}' to any week")
-            
-            
+            segregate_ads_by_week(src_ads, week_structure, ads_weekly_totals)
         else:
             print("  ⚠️ 'Addition Deductions Details' sheet not found")
 
-        # 6. Check D1W sheets for Extra inventory ads (always check)
+        # 7. Check D1W sheets for Extra inventory ads (always check)
         print("\n🔍 Checking D1W sheets for 'Extra inventory ads (order level deduction)'...")
         for week in week_structure:
             wn = week['week_num']
@@ -284,7 +314,7 @@ def process_zomato_consolidated(
                             print(f"  ✅ Week {wn} Extra Ads: {val} (Total Ads now: {ads_weekly_totals[wn]})")
                         break
 
-        # 7. Map Ads to Cashflow
+        # 8. Map Ads to Cashflow
         if "Cashflow" in recon.sheetnames:
             cashflow = recon["Cashflow"]
             high_priority_row = -1
@@ -304,7 +334,7 @@ def process_zomato_consolidated(
             else:
                 print("  ⚠️ 'High Priority' label not found in Cashflow sheet")
 
-        # 7. Finalize
+        # 9. Finalize
         replace_month_in_sheets(recon, month)
         recon.save(output_path)
         recon.close()
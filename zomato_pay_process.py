@@ -3,8 +3,13 @@ import os
 import openpyxl
 import re
 from datetime import datetime
-from werkzeug.utils import secure_filename
 import gc
+from functools import partial
+from itertools import chain
+import numpy as np
+
+from invoice_reader import SheetReader, header_contains, open_invoice_workbook
+from upload_buffer import UploadSpool, iter_read_uploads
 
 def get_safe_dimensions(sheet):
     """Safe way to get max_row and max_column in read_only mode"""
@@ -63,13 +68,111 @@ def safe_float(v):
     except:
         return 0.0
 
+DATE_NUMBERS = re.compile(r'\d+')
+DATE_PART_MAX = 10 ** 9  # Keeps absurd digit runs inside int64; still past any day/month
+
+def parse_day_month(values):
+    """
+    Day and month arrays for a column of date cells: datetimes, or text whose first three
+    numbers are YYYY-MM-DD or DD-MM-YYYY. Day is -1 where a cell has no usable date.
+    """
+    days = np.full(len(values), -1, dtype=np.int64)
+    months = np.zeros(len(values), dtype=np.int64)
+    parsed = {}  # Text dates repeat across rows of the same day
+    for idx, val in enumerate(values):
+        if not val: continue
+        if isinstance(val, datetime):
+            days[idx], months[idx] = val.day, val.month
+            continue
+        text = str(val)
+        if text not in parsed:
+            parts = DATE_NUMBERS.findall(text)
+            if len(parts) < 3:
+                parsed[text] = None
+            else:
+                d, m = (parts[2], parts[1]) if len(parts[0]) == 4 else (parts[0], parts[1])
+                parsed[text] = (min(int(d), DATE_PART_MAX), min(int(m), DATE_PART_MAX))
+        if parsed[text]:
+            days[idx], months[idx] = parsed[text]
+    return days, months
+
+def assign_weeks(days, weeks):
+    """
+    Index of the week range holding each day, -1 if none (or no date).
+    Ranges may overlap (week 5 comes from the form); the first one listed wins.
+    """
+    if not weeks:
+        return np.full(len(days), -1, dtype=np.int64)
+    # Membership only changes at a range start or just past a range end
+    edges = sorted({ws for ws, _ in weeks} | {we + 1 for _, we in weeks})
+    segment_week = np.full(len(edges) + 1, -1, dtype=np.int64)
+    for k in range(1, len(edges)):
+        start = edges[k - 1]
+        segment_week[k] = next((i for i, (ws, we) in enumerate(weeks) if ws <= start <= we), -1)
+    week_idx = segment_week[np.searchsorted(edges, days, side='right')]
+    return np.where(days >= 0, week_idx, -1)
+
+def column_floats(rows, col):
+    """safe_float of one column of every row, as an array"""
+    return np.fromiter((safe_float(row[col]) for row in rows), dtype=np.float64, count=len(rows))
+
+def grouped_sums(groups, values, n_groups, empty=0):
+    """
+    Sum of values per group index (rows with -1 are left out), added in row order
+    like the old per-row loop. Groups without rows, or a missing (None) column, give `empty`.
+    """
+    if values is None:
+        return [empty] * n_groups
+    mask = groups >= 0
+    sums = np.bincount(groups[mask], weights=values[mask], minlength=n_groups)
+    counts = np.bincount(groups[mask], minlength=n_groups)
+    return [float(total) if count else empty for total, count in zip(sums, counts)]
+
+def month_adjustment_groups(days, months, target_month_num):
+    """0 for dated rows before the target month, 1 for rows after it, -1 otherwise"""
+    groups = np.full(len(days), -1, dtype=np.int64)
+    if target_month_num:
+        dated = days >= 0
+        groups[dated & (months < target_month_num)] = 0
+        groups[dated & (months > target_month_num)] = 1
+    return groups
+
+# Transactions summary headers the calculations look up (the find_col names in process_zomato_pay)
+ZPAY_TRANSACTION_COLUMNS = [header_contains(name) for name in [
+    "date and time", "bill amount", "instant discount", "promo share",
+    "commission amount", "tips", "net receivable"
+]]
+
+def read_zpay_invoice(filename, source, full_dump=True, reader_backend="openpyxl"):
+    """
+    Non-empty Transactions summary rows (from row 7) and Additions & deductions
+    rows (from row 3) of one invoice. Only reads, so it can run in a worker process.
+    full_dump=False keeps only the ZPAY_TRANSACTION_COLUMNS of the transactions.
+    """
+    transactions, ads = [], []
+    wb_in = open_invoice_workbook(source, reader_backend)
+    if "Transactions summary" in wb_in.sheetnames:
+        # Capture from actual data row 7 (the header row)
+        reader = SheetReader(wb_in["Transactions summary"], 7, None if full_dump else ZPAY_TRANSACTION_COLUMNS)
+        for row in chain([reader.header], reader.rows()):
+            if any(row): transactions.append(row)
+
+    if "Additions & deductions" in wb_in.sheetnames:
+        for row in wb_in["Additions & deductions"].iter_rows(min_row=3, values_only=True):
+            if any(row): ads.append(row)
+    wb_in.close()
+    return transactions, ads
+
 def process_zomato_pay(invoice_files, template_path, output_dir, update_progress=None, 
                        client_name="", month="", first_start=None, first_end=None, 
-                       last_start=None, last_end=None, forced_filename=None):
+                       last_start=None, last_end=None, forced_filename=None, read_workers=None,
+                       full_dump=True, reader_backend="openpyxl"):
     """
     Ultra-optimized Zomato Pay reconciliation with refined logic.
+    read_workers: most processes reading the uploads (None = auto, see iter_read_uploads)
+    full_dump: False pastes only the transaction columns the calculations use
+    reader_backend: "openpyxl" or "xml" (see invoice_reader.READER_BACKENDS)
     """
-    temp_files = []
     try:
         if update_progress: update_progress(5)
 
@@ -90,38 +193,23 @@ def process_zomato_pay(invoice_files, template_path, output_dir, update_progress
         processed_data = [] # Stores Transaction Summary
         ads_data = [] # Stores Ad Summary
 
-        # 2. Fast Input Reading (Read-Only)
-        for idx, file in enumerate(invoice_files):
-            filename = secure_filename(file.filename)
-            temp_path = os.path.join(output_dir, f"temp_zpay_{filename}")
-            file.save(temp_path)
-            temp_files.append(temp_path)
-
-            wb_in = openpyxl.load_workbook(temp_path, read_only=True, data_only=True)
-            if "Transactions summary" in wb_in.sheetnames:
-                # Capture from actual data row 7
-                for row in wb_in["Transactions summary"].iter_rows(min_row=7, values_only=True):
-                    if any(row): processed_data.append(row)
-            
-            if "Additions & deductions" in wb_in.sheetnames:
-                for row in wb_in["Additions & deductions"].iter_rows(min_row=3, values_only=True):
-                    if any(row): ads_data.append(row)
-            wb_in.close()
+        # 2. Fast Input Reading (Read-Only, straight from the uploads - nothing lands in output_dir)
+        # Files may be read in parallel; rows are merged back in upload order
+        uploads = [(file.filename, file) for file in invoice_files]
+        with UploadSpool() as spool:
+            reader = partial(read_zpay_invoice, full_dump=full_dump, reader_backend=reader_backend)
+            for transactions, ads in iter_read_uploads(reader, uploads, spool, read_workers):
+                processed_data.extend(transactions)
+                ads_data.extend(ads)
         
         if update_progress: update_progress(35)
 
         # 3. Batch Write to Template (Fast Append)
         # Create 14 row gap as requested
         for _ in range(14): ws_calc.append([])
-        for row in processed_data: ws_calc.append(row)
-        
-        for _ in range(5): ws_ads.append([])
-        for row in ads_data: ws_ads.append(row)
-
-        if update_progress: update_progress(60)
 
-        # 4. Calculation Mapping (Headers sit at Row 15)
-        headers = [str(cell.value).strip().lower() if cell.value else "" for cell in ws_calc[15]]
+        # 4. Calculation Mapping (Headers sit at Row 15, i.e. the first transaction row)
+        headers = [str(v).strip().lower() if v else "" for v in (processed_data[0] if processed_data else ())]
         def find_col(possible_names):
             for name in possible_names:
                 for idx, h in enumerate(headers):
@@ -145,62 +233,42 @@ def process_zomato_pay(invoice_files, template_path, output_dir, update_progress
         target_month_num = month_map.get(month.lower())
 
         weeks, _ = get_week_ranges(first_start, first_end, last_start, last_end)
-        weekly_stats = {i: {'bill':0, 'disc':0, 'comm':0, 'tip':0, 'net':0} for i in range(len(weeks))}
-        
-        # Adjustments for prev/next month
-        adj_prev_month = 0.0
-        adj_next_month = 0.0
-
-        # Performance: Loop over processed_data list directly (starting from Row 16 equivalent)
-        for idx, row in enumerate(processed_data):
-            date_val = row[col_date]
-            if not date_val: continue
-            
-            day, m_num = None, None
-            if isinstance(date_val, datetime):
-                day, m_num = date_val.day, date_val.month
-            else:
-                parts = re.findall(r'\d+', str(date_val))
-                if len(parts) >= 3:
-                    if len(parts[0]) == 4: # YYYY-MM-DD
-                        day, m_num = int(parts[2]), int(parts[1])
-                    else: # DD-MM-YYYY
-                        day, m_num = int(parts[0]), int(parts[1])
-
-            if day is None: continue
-            
-            # Handle Adjustments (Prev/Next month)
-            if target_month_num:
-                # Logic to determine if prev or next month relative to target
-                is_prev = False
-                is_next = False
-                if m_num < target_month_num:
-                    if not (target_month_num == 1 and m_num == 12): is_prev = True # e.g., target Jan (1), m_num Dec (12) -> prev
-                    else: is_next = True # e.g., target Feb (2), m_num Jan (1) -> prev
-                elif m_num > target_month_num:
-                    if not (target_month_num == 12 and m_num == 1): is_next = True # e.g., target Dec (12), m_num Jan (1) -> next
-                    else: is_prev = True # e.g., target Nov (11), m_num Dec (12) -> next
-                
-                if is_prev: adj_prev_month += safe_float(row[col_net])
-                if is_next: adj_next_month += safe_float(row[col_net])
 
-                # Skip weekly distribution for adjustment rows
-                if m_num != target_month_num: continue
+        # Whole columns at once: parse dates, bucket rows into weeks, then sum per week
+        days, months = parse_day_month([row[col_date] for row in processed_data])
+        net = column_floats(processed_data, col_net)
 
-            for i, (ws, we) in enumerate(weeks):
-                if ws <= day <= we:
-                    stats = weekly_stats[i]
-                    stats['bill'] += safe_float(row[col_bill])
-                    # Fixed Logic: Discounts use direct sum to match yellow cell
-                    stats['disc'] += (safe_float(row[col_discount]) if col_discount != -1 else 0) + \
-                                     (safe_float(row[col_promo]) if col_promo != -1 else 0)
-                    stats['comm'] += safe_float(row[col_comm])
-                    stats['tip'] += safe_float(row[col_tip]) if col_tip != -1 else 0
-                    stats['net'] += safe_float(row[col_net])
-                    
-                    # Mark week for debugger
-                    ws_calc.cell(row=15+idx, column=len(row)+1).value = f"W{i+1}"
-                    break
+        # Rows dated in the previous/next month are adjustments, kept out of the weeks
+        adj_prev_month, adj_next_month = grouped_sums(
+            month_adjustment_groups(days, months, target_month_num), net, 2, empty=0.0)
+        if target_month_num:
+            days = np.where(months == target_month_num, days, -1)
+        week_idx = assign_weeks(days, weeks)
+
+        def optional_floats(col):
+            return column_floats(processed_data, col) if col != -1 else None
+
+        # Fixed Logic: Discounts use direct sum to match yellow cell
+        discount, promo = optional_floats(col_discount), optional_floats(col_promo)
+        if discount is not None and promo is not None:
+            discount = discount + promo
+        elif discount is None:
+            discount = promo
+        weekly_columns = {
+            'bill': column_floats(processed_data, col_bill),
+            'disc': discount,
+            'comm': column_floats(processed_data, col_comm),
+            'tip': optional_floats(col_tip),
+            'net': net,
+        }
+        weekly_totals = {key: grouped_sums(week_idx, values, len(weeks)) for key, values in weekly_columns.items()}
+        weekly_stats = {i: {key: totals[i] for key, totals in weekly_totals.items()} for i in range(len(weeks))}
+
+        # Rows go in with their week marker (for the debugger) as one extra trailing cell
+        for row, i in zip(processed_data, week_idx.tolist()):
+            ws_calc.append(row + (f"W{i+1}",) if i >= 0 else row)
+
+        if update_progress: update_progress(60)
 
         # 5. Inject Weekly Results into Row 2-6 (G onwards)
         calc_results = {i: stats for i, stats in weekly_stats.items()}
@@ -214,8 +282,8 @@ def process_zomato_pay(invoice_files, template_path, output_dir, update_progress
             ws_calc.cell(row=5, column=x_col).value = stats['tip']
             ws_calc.cell(row=6, column=x_col).value = stats['net']
 
-        # 6. Zpay Ads Logic - Correction: headers are in row 6 (after insert_rows(1,5))
-        ads_headers = [str(ws_ads.cell(row=6, column=c).value).strip().lower() if ws_ads.cell(row=6, column=c).value else "" for c in range(1, ws_ads.max_column + 1)]
+        # 6. Zpay Ads Logic - headers are the first ads row (row 6, under 5 blank rows)
+        ads_headers = [str(v).strip().lower() if v else "" for v in (ads_data[0] if ads_data else ())]
         col_ads_date = -1
         col_ads_amt = -1
         for idx, h in enumerate(ads_headers):
@@ -225,46 +293,35 @@ def process_zomato_pay(invoice_files, template_path, output_dir, update_progress
         ads_weekly = {i: 0.0 for i in range(len(weeks))}
         ads_prev_month = 0.0
         ads_next_month = 0.0
+        ads_markers = {}  # ads_data index -> week marker
 
         if col_ads_date != -1 and col_ads_amt != -1:
-            for idx, row in enumerate(ads_data):
-                date_val = row[col_ads_date]
-                if not date_val: continue
-                day, m_num = None, None
-                if isinstance(date_val, datetime):
-                    day, m_num = date_val.day, date_val.month
-                else:
-                    parts = re.findall(r'\d+', str(date_val))
-                    if len(parts) >= 3:
-                        if len(parts[0]) == 4: day, m_num = int(parts[2]), int(parts[1])
-                        else: day, m_num = int(parts[0]), int(parts[1])
-                
-                if day is None: continue
-
-                # Handle Adjustments for Ads
-                if target_month_num:
-                    is_prev = False
-                    is_next = False
-                    if m_num < target_month_num:
-                        if not (target_month_num == 1 and m_num == 12): is_prev = True
-                        else: is_next = True
-                    elif m_num > target_month_num:
-                        if not (target_month_num == 12 and m_num == 1): is_next = True
-                        else: is_prev = True
-                    
-                    if is_prev: ads_prev_month += safe_float(row[col_ads_amt])
-                    if is_next: ads_next_month += safe_float(row[col_ads_amt])
-
-                if day is None or (target_month_num and m_num != target_month_num):
-                    continue
-                
-                for i, (ws, we) in enumerate(weeks):
-                    if ws <= day <= we:
-                        val = safe_float(row[col_ads_amt])
-                        ads_weekly[i] += val
-                        ws_ads.cell(row=7+idx, column=len(row)+1).value = f"W{i+1}"
-                        break
-        
+            ads_days, ads_months = parse_day_month([row[col_ads_date] for row in ads_data])
+            ads_amounts = column_floats(ads_data, col_ads_amt)
+
+            # Handle Adjustments for Ads
+            ads_prev_month, ads_next_month = grouped_sums(
+                month_adjustment_groups(ads_days, ads_months, target_month_num), ads_amounts, 2, empty=0.0)
+            if target_month_num:
+                ads_days = np.where(ads_months == target_month_num, ads_days, -1)
+            ads_week_idx = assign_weeks(ads_days, weeks)
+            ads_weekly = dict(enumerate(grouped_sums(ads_week_idx, ads_amounts, len(weeks), empty=0.0)))
+
+            ads_markers = {idx: f"W{ads_week_idx[idx]+1}" for idx in np.flatnonzero(ads_week_idx >= 0).tolist()}
+
+        # Ads rows go in with their markers in one pass of appends. A marker sits one row
+        # below its ad (in the column after that ad's last cell), as it always has, so
+        # each row carries the marker of the ad above it and the last marker gets a row of its own.
+        for _ in range(5): ws_ads.append([])
+        for idx in range(len(ads_data) + 1):
+            row = ads_data[idx] if idx < len(ads_data) else ()
+            marker = ads_markers.get(idx - 1)
+            if marker is not None:
+                col = len(ads_data[idx - 1])
+                row = list(row[:col]) + [None] * (col - len(row)) + [marker] + list(row[col + 1:])
+            if idx < len(ads_data) or marker is not None:
+                ws_ads.append(row)
+
         for i in range(len(weeks)):
             ws_ads.cell(row=1, column=7+i).value = f"W{i+1}"
             ws_ads.cell(row=2, column=7+i).value = ads_weekly[i]
@@ -319,10 +376,6 @@ def process_zomato_pay(invoice_files, template_path, output_dir, update_progress
         out_wb.save(full_path)
         out_wb.close()
         
-        for f in temp_files:
-            try: os.remove(f)
-            except: pass
-        
         if update_progress: update_progress(100)
         gc.collect()
         return output_filename, None